@@ -0,0 +1,51 @@
+import os
+import subprocess
+import sys
+import time
+from argparse import ArgumentParser
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+sys.path.insert(0, str(ROOT))
+
+
+def best_of(repeat: int, code: str) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, "-c", code],
+            env={**os.environ, "PYTHONPATH": str(ROOT)},
+            check=True,
+        )
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    python = best_of(args.repeat, "pass")
+    print(f"{'python:':<24} {python * 1000:8.1f} ms")
+    for label, code in (
+        ("import main:", "import main"),
+        ("import datasets:", "import datasets"),
+        (
+            "import main + medical:",
+            "import main; main.prep_medical(main.LoadConfig(random_seed=42))",
+        ),
+    ):
+        elapsed = best_of(args.repeat, code)
+        print(f"{label:<24} {elapsed * 1000:8.1f} ms")
+
+    from main import PUBMEDQA_SNAPSHOT
+
+    if not PUBMEDQA_SNAPSHOT.exists():
+        print(f"(no snapshot at {PUBMEDQA_SNAPSHOT}, medical loaded from the hub)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,321 @@
+import csv
+import gc
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+from argparse import ArgumentParser
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any
+
+ROOT = Path(__file__).resolve().parents[1]
+
+sys.path.insert(0, str(ROOT))
+
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+import pyarrow as pa  # noqa: E402
+
+from main import (  # noqa: E402
+    FINQA_DIR,
+    FINQA_SPLITS,
+    MAUD_TASKS,
+    PUBMEDQA_SNAPSHOT,
+    LoadConfig,
+    balance,
+    finqa_path,
+    format_table_as_text,
+    generate_plausible_answers,
+    iter_json_array,
+    map_sources,
+    mctest_paths,
+    prep_financial,
+    prep_legal,
+    prep_medical,
+    prep_reading_comprehension,
+    record_uniforms,
+    run_loader,
+)
+
+# Approximate row counts of the real sources at 1x.
+MAUD_ROWS = (50, 250)
+FINQA_RECORDS = {"train": 6251, "dev": 883, "test": 1147}
+MCTEST_STORIES = {
+    "mc160": {"train": 70, "dev": 30, "test": 60},
+    "mc500": {"train": 300, "dev": 50, "test": 150},
+}
+FINQA_QUESTIONS_PER_PAGE = 3
+PUBMEDQA_ROWS = 1000
+
+# Bumped when the generated fixtures change, so older ones are rebuilt.
+FIXTURE_VERSION = "2"
+
+WORDS = (
+    "the company agreement merger shall party buyer parent material adverse "
+    "effect closing consent board revenue income net total percent million "
+    "patients study results treatment clinical mary went store because"
+).split()
+
+
+def sentence(rnd: random.Random, words: int) -> str:
+    return " ".join(rnd.choices(WORDS, k=words)).capitalize() + "."
+
+
+def paragraph(rnd: random.Random, sentences: int) -> str:
+    return " ".join(sentence(rnd, rnd.randint(8, 20)) for _ in range(sentences))
+
+
+def write_maud(rnd: random.Random, scale: int) -> None:
+    for task in MAUD_TASKS.values():
+        path = task.path / "test.tsv"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f, delimiter="\t")
+            writer.writerow(["answer", "index", "text"])
+            for index in range(rnd.randint(*MAUD_ROWS) * scale):
+                text = "\n".join(paragraph(rnd, 5) for _ in range(rnd.randint(2, 5)))
+                writer.writerow([rnd.choice(task.answers)[0], index, text])
+
+
+def finqa_page(rnd: random.Random, index: int) -> dict[str, Any]:
+    years = [str(2019 - i) for i in range(rnd.randint(2, 4))]
+    table = [["", *years]] + [
+        [sentence(rnd, 3), *(f"${rnd.randint(1, 9999)}" for _ in years)]
+        for _ in range(rnd.randint(3, 8))
+    ]
+    return {
+        "pre_text": [sentence(rnd, 20) for _ in range(rnd.randint(5, 15))],
+        "post_text": [sentence(rnd, 20) for _ in range(rnd.randint(3, 10))],
+        "filename": f"ABC/{2010 + index % 10}/page_{index}.pdf",
+        "table": table,
+    }
+
+
+def finqa_record(
+    rnd: random.Random, split: str, index: int, page: dict[str, Any]
+) -> dict[str, Any]:
+    qa: dict[str, Any] = {"question": sentence(rnd, 12).rstrip(".") + "?"}
+    kind = rnd.random()
+    if kind < 0.05:
+        qa.update(answer=rnd.choice(["yes", "no"]), exe_ans="yes")
+    elif kind < 0.5:
+        qa.update(answer="", exe_ans=rnd.uniform(-1, 1))
+    else:
+        qa.update(answer=f"{rnd.uniform(-100, 100):.1f}%", exe_ans=0.0)
+    return {**page, "id": f"{page['filename']}-{split}-{index}", "qa": qa}
+
+
+def write_finqa(rnd: random.Random, scale: int) -> None:
+    FINQA_DIR.mkdir(parents=True, exist_ok=True)
+    for split, records in FINQA_RECORDS.items():
+        # Written record by record so 100x fixtures fit in memory.
+        with open(finqa_path(split), "w", encoding="utf-8") as f:
+            f.write("[\n")
+            for i in range(records * scale):
+                if i:
+                    f.write(",\n")
+                # As in FinQA, about three questions are asked of each page.
+                if i % FINQA_QUESTIONS_PER_PAGE == 0:
+                    page = finqa_page(rnd, i // FINQA_QUESTIONS_PER_PAGE)
+                json.dump(finqa_record(rnd, split, i, page), f, indent=4)
+            f.write("\n]\n")
+
+
+def write_mctest(rnd: random.Random, scale: int) -> None:
+    for name, splits in MCTEST_STORIES.items():
+        for split, stories in splits.items():
+            tsv, ans = mctest_paths(name, split)
+            tsv.parent.mkdir(parents=True, exist_ok=True)
+            ans.parent.mkdir(parents=True, exist_ok=True)
+            tsv_lines, ans_lines = [], []
+            for i in range(stories * scale):
+                story = "\\newline".join(paragraph(rnd, 4) for _ in range(4))
+                parts = [f"{name}.{split}.{i}", "Author: x;Work Time(s): 1", story]
+                for _ in range(4):
+                    kind = rnd.choice(["one", "multiple"])
+                    parts.append(f"{kind}: {sentence(rnd, 8).rstrip('.')}?")
+                    parts.extend(sentence(rnd, 3).rstrip(".") for _ in range(4))
+                tsv_lines.append("\t".join(parts))
+                ans_lines.append("\t".join(rnd.choices("ABCD", k=4)))
+            tsv.write_text("\n".join(tsv_lines) + "\n", encoding="utf-8")
+            ans.write_text("\n".join(ans_lines) + "\n", encoding="utf-8")
+
+
+def write_pubmedqa(rnd: random.Random, scale: int) -> None:
+    rows = PUBMEDQA_ROWS * scale
+    table = pa.table(
+        {
+            "pubid": pa.array(range(rows), pa.int32()),
+            "contexts": [
+                [paragraph(rnd, 3) for _ in range(rnd.randint(2, 4))]
+                for _ in range(rows)
+            ],
+            "question": [sentence(rnd, 10).rstrip(".") + "?" for _ in range(rows)],
+            "final_decision": rnd.choices(["yes", "no", "maybe"], k=rows),
+        }
+    )
+    PUBMEDQA_SNAPSHOT.parent.mkdir(parents=True, exist_ok=True)
+    with pa.ipc.new_file(PUBMEDQA_SNAPSHOT, table.schema) as writer:
+        writer.write_table(table)
+
+
+def make_fixtures(root: Path, scale: int) -> None:
+    done = root / ".complete"
+    if done.exists() and done.read_text() == FIXTURE_VERSION:
+        return
+    root.mkdir(parents=True, exist_ok=True)
+    os.chdir(root)
+    rnd = random.Random(scale)
+    for write in (write_maud, write_finqa, write_mctest, write_pubmedqa):
+        write(rnd, scale)
+    done.write_text(FIXTURE_VERSION)
+
+
+def stages(scale: int) -> dict[str, tuple[Callable[[], Any], Callable[[Any], Any]]]:
+    # Each stage is (setup, run); only run is timed and traced.
+    config = LoadConfig(random_seed=42, finqa_splits=FINQA_SPLITS)
+
+    def tables() -> list[list[list[str]]]:
+        return [
+            record["table"]
+            for split in FINQA_SPLITS
+            for record in iter_json_array(finqa_path(split))
+        ]
+
+    def render(tables: list[list[list[str]]]) -> None:
+        rendered: dict[str, tuple[list[list[str]], str]] = {}
+        for table in tables:
+            format_table_as_text(table, "pipe", rendered)
+
+    def answers() -> tuple[np.ndarray, pd.Series, np.ndarray]:
+        n = sum(FINQA_RECORDS.values()) * scale
+        rng = np.random.default_rng(0)
+        questions = [f"what is the percent change {i}?" for i in range(n)]
+        ids = [f"record-{i}" for i in range(n)]
+        return (
+            rng.uniform(-100, 100, n),
+            pd.Series(questions),
+            record_uniforms(ids, 42, 14),
+        )
+
+    def sources() -> dict[str, Any]:
+        return map_sources(run_loader, config, 1)
+
+    return {
+        "prep_legal": (lambda: None, lambda _: prep_legal(config)),
+        "prep_medical": (lambda: None, lambda _: prep_medical(config)),
+        "prep_financial": (lambda: None, lambda _: prep_financial(config)),
+        "prep_reading_comprehension": (
+            lambda: None,
+            lambda _: prep_reading_comprehension(config),
+        ),
+        "format_table_as_text": (tables, render),
+        "generate_plausible_answers": (
+            answers,
+            lambda args: generate_plausible_answers(*args),
+        ),
+        "sampling": (
+            sources,
+            lambda frames: balance(frames, 600 * scale, 42, ("task_id", "answer")),
+        ),
+    }
+
+
+# The rounding step of each recorded measurement.
+RESOLUTION = {"seconds": 0.0001, "peak_mib": 0.1}
+
+
+def measure(
+    setup: Callable[[], Any], run: Callable[[Any], Any], repeat: int
+) -> dict[str, float]:
+    data = setup()
+    timings = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        run(data)
+        timings.append(time.perf_counter() - start)
+
+    # tracemalloc doesn't see Arrow buffers, so the run also gets its own
+    # Arrow pool and the peaks of both are added.
+    gc.collect()
+    parent = pa.default_memory_pool()
+    pool = pa.proxy_memory_pool(parent)
+    pa.set_memory_pool(pool)
+    tracemalloc.start()
+    try:
+        run(data)
+        peak = tracemalloc.get_traced_memory()[1] + pool.max_memory()
+    finally:
+        tracemalloc.stop()
+        pa.set_memory_pool(parent)
+    return {"seconds": round(min(timings), 4), "peak_mib": round(peak / (1 << 20), 1)}
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10])
+    parser.add_argument("--stages", nargs="+")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--fixtures-dir", type=Path, default=ROOT / ".cache" / "benchmarks"
+    )
+    parser.add_argument(
+        "--baseline", type=Path, default=ROOT / "benchmarks" / "baseline.json"
+    )
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=1.25)
+    args = parser.parse_args()
+
+    baseline = {}
+    if args.baseline.exists():
+        baseline = json.loads(args.baseline.read_text())
+
+    results: dict[str, dict[str, dict[str, float]]] = {}
+    regressions = []
+    for scale in args.scales:
+        root = (args.fixtures_dir / f"{scale}x").resolve()
+        make_fixtures(root, scale)
+        os.chdir(root)
+
+        results[f"{scale}x"] = {}
+        print(f"{scale}x ({root})")
+        for name, (setup, run) in stages(scale).items():
+            if args.stages and name not in args.stages:
+                continue
+            result = measure(setup, run, args.repeat)
+            results[f"{scale}x"][name] = result
+
+            line = (
+                f"  {name:<28} {result['seconds']:9.3f} s {result['peak_mib']:9.1f} MiB"
+            )
+            before = baseline.get(f"{scale}x", {}).get(name)
+            if before is not None:
+                # Baselines are rounded and may be 0; the rounding step stands in.
+                ratios = {
+                    key: result[key] / max(before[key], RESOLUTION[key])
+                    for key in result
+                }
+                line += f"  {ratios['seconds']:5.2f}x time {ratios['peak_mib']:5.2f}x memory"
+                # Stages under 10 ms are too noisy to flag on time.
+                if before["seconds"] < 0.01:
+                    del ratios["seconds"]
+                if max(ratios.values()) > args.tolerance:
+                    line += "  REGRESSION"
+                    regressions.append(f"{scale}x {name}")
+            print(line)
+
+    if args.save_baseline:
+        for scale, measured in results.items():
+            baseline.setdefault(scale, {}).update(measured)
+        args.baseline.write_text(json.dumps(baseline, indent=2, sort_keys=True) + "\n")
+        print(f"baseline written to {args.baseline}")
+    elif regressions:
+        raise SystemExit(f"regressed against baseline: {', '.join(regressions)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+import json
+import sys
+import time
+from argparse import ArgumentParser
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any
+
+ROOT = Path(__file__).resolve().parents[1]
+
+sys.path.insert(0, str(ROOT))
+
+import pandas as pd  # noqa: E402
+
+from reader import CrossDomainDataset  # noqa: E402
+
+
+def best_of(repeat: int, fn: Callable[[], Any]) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument("csv", type=Path)
+    parser.add_argument("arrow", type=Path)
+    parser.add_argument("--domain", default="legal")
+    parser.add_argument("--task-id")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    def read_csv() -> None:
+        df = pd.read_csv(args.csv)
+        df = df[df["domain"] == args.domain]
+        if args.task_id is not None:
+            df = df[df["task_id"] == args.task_id]
+        for answers in df["answers"]:
+            json.loads(answers)
+
+    def iterate(path: Path) -> Callable[[], None]:
+        def run() -> None:
+            dataset = CrossDomainDataset(path)
+            for _ in dataset.iter_batches(domain=args.domain, task_id=args.task_id):
+                pass
+
+        return run
+
+    dataset = CrossDomainDataset(args.arrow)
+    rows = dataset.rows(domain=args.domain, task_id=args.task_id)
+    print(f"{len(rows)} of {len(dataset)} rows selected")
+    for label, fn in (
+        ("pd.read_csv + filter:", read_csv),
+        ("CrossDomainDataset csv:", iterate(args.csv)),
+        ("CrossDomainDataset arrow:", iterate(args.arrow)),
+        ("row access x1000:", lambda: [dataset[int(i)] for i in rows[:1000]]),
+    ):
+        elapsed = best_of(args.repeat, fn)
+        print(f"{label:<28} {elapsed * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+import json
+import sys
+import time
+from argparse import ArgumentParser
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from main import format_table_as_text  # noqa: E402
+
+
+def legacy_format_table_as_text(table: list[list[str]]) -> str:
+    if not table:
+        return ""
+
+    cleaned_table = []
+    for row in table:
+        cleaned_row = []
+        for cell in row:
+            cell_str = str(cell).strip()
+            cleaned_row.append(cell_str)
+        cleaned_table.append(cleaned_row)
+
+    if not cleaned_table:
+        return ""
+
+    col_widths = []
+    for col_idx in range(len(cleaned_table[0])):
+        max_width = 0
+        for row in cleaned_table:
+            if col_idx < len(row):
+                max_width = max(max_width, len(row[col_idx]))
+        col_widths.append(max_width)
+
+    formatted_lines = []
+    for i, row in enumerate(cleaned_table):
+        padded_cells = []
+        for j, cell in enumerate(row):
+            if j < len(col_widths):
+                padded_cells.append(cell.ljust(col_widths[j]))
+            else:
+                padded_cells.append(cell)
+
+        formatted_line = " | ".join(padded_cells)
+        formatted_lines.append(formatted_line)
+
+        if i == 0 and len(cleaned_table) > 1:
+            separator = " | ".join(["-" * width for width in col_widths])
+            formatted_lines.append(separator)
+
+    return "\n".join(formatted_lines)
+
+
+def best_of(repeat: int, fn, records) -> float:
+    timings = []
+    for _ in range(repeat):
+        # A fresh memo per repeat, as every load starts with an empty one.
+        rendered = {}
+        start = time.perf_counter()
+        for record in records:
+            fn(record, rendered)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument("--finqa-dir", type=Path, default=Path("./FinQA/dataset"))
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    records = []
+    for split in ("train", "dev", "test"):
+        with open(args.finqa_dir / f"{split}.json", "r", encoding="utf-8") as f:
+            records.extend(record for record in json.load(f) if record["table"])
+
+    for record in records:
+        table = record["table"]
+        if format_table_as_text(table) != legacy_format_table_as_text(table):
+            raise AssertionError(f"pipe style differs from legacy output: {table}")
+
+    distinct = len({tuple(map(tuple, record["table"])) for record in records})
+    print(f"{len(records)} tables, {distinct} distinct")
+
+    legacy = best_of(
+        args.repeat, lambda r, _: legacy_format_table_as_text(r["table"]), records
+    )
+    print(f"{'legacy:':<10} {legacy * 1000:8.1f} ms")
+    for style in ("pipe", "markdown", "tsv"):
+        timings = []
+        for fn in (
+            lambda r, _: format_table_as_text(r["table"], style),
+            lambda r, rendered: format_table_as_text(r["table"], style, rendered),
+        ):
+            elapsed = best_of(args.repeat, fn, records)
+            timings.append(f"{elapsed * 1000:8.1f} ms ({legacy / elapsed:4.1f}x)")
+        print(
+            f"{style + ':':<10} {timings[0]} every table {timings[1]} memoized per load"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Final
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from dedup import tokenize
+
+# Passages tokenized and counted per task of the build.
+BM25_BLOCK: Final[int] = 4096
+
+POSTINGS_TYPE: Final[pa.DataType] = pa.large_list(
+    pa.struct([("passage", pa.int32()), ("tf", pa.int32())])
+)
+
+
+def index_paths(path: str | Path) -> tuple[Path, Path]:
+    path = Path(path)
+    return (
+        path.with_name(f"{path.name}.bm25.terms.arrow"),
+        path.with_name(f"{path.name}.bm25.passages.arrow"),
+    )
+
+
+def count_terms(
+    strings: pa.Array,
+) -> tuple[pa.Array, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    # The block's distinct terms, its (term, passage, frequency) triples with
+    # terms as codes into them, sorted by term then passage, and the length
+    # of every passage in tokens.
+    tokens, rows = tokenize(strings)
+    encoded = tokens.dictionary_encode()
+    n = len(strings)
+    keys, tf = np.unique(
+        encoded.indices.to_numpy().astype(np.int64) * n + rows, return_counts=True
+    )
+    lengths = np.bincount(rows, minlength=n)
+    return encoded.dictionary, keys // n, keys % n, tf, lengths
+
+
+def build_index(passages: pd.DataFrame, jobs: int = 1) -> tuple[pa.Table, pa.Table]:
+    texts = pa.array(passages["text"], from_pandas=True)
+    blocks = [
+        texts.slice(start, BM25_BLOCK)
+        for start in range(0, max(len(texts), 1), BM25_BLOCK)
+    ]
+    # Arrow's tokenizer kernels release the GIL, so blocks run on threads.
+    with ThreadPoolExecutor(max_workers=max(jobs, 1)) as pool:
+        counted = list(pool.map(count_terms, blocks))
+
+    # Term ids follow the sorted vocabulary, so every block's codes are
+    # mapped through one encoding of all the block vocabularies.
+    dictionaries = [block[0] for block in counted]
+    encoded = pa.concat_arrays(dictionaries).dictionary_encode()
+    order = pc.array_sort_indices(encoded.dictionary).to_numpy()
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    term_ids = rank[encoded.indices.to_numpy()]
+    bounds = np.cumsum([0] + [len(d) for d in dictionaries])
+
+    terms = np.concatenate(
+        [term_ids[bounds[i] : bounds[i + 1]][c[1]] for i, c in enumerate(counted)]
+    )
+    docs = np.concatenate([c[2] + i * BM25_BLOCK for i, c in enumerate(counted)])
+    tfs = np.concatenate([c[3] for c in counted])
+    lengths = np.concatenate([c[4] for c in counted])
+
+    # Blocks are in passage order, so a stable sort by term leaves every
+    # term's postings sorted by passage.
+    by_term = np.argsort(terms, kind="stable")
+    offsets = np.concatenate([[0], np.cumsum(np.bincount(terms, minlength=len(order)))])
+    postings = pa.LargeListArray.from_arrays(
+        pa.array(offsets, pa.int64()),
+        pa.StructArray.from_arrays(
+            [pa.array(docs[by_term], pa.int32()), pa.array(tfs[by_term], pa.int32())],
+            fields=list(POSTINGS_TYPE.value_type),
+        ),
+    )
+    term_table = pa.table(
+        {
+            "term": encoded.dictionary.take(order).cast(pa.string()),
+            "postings": postings,
+        }
+    )
+    passage_table = pa.table(
+        {
+            "passage_id": pa.array(passages["passage_id"], pa.string()),
+            "length": pa.array(lengths, pa.int32()),
+        }
+    )
+    return term_table, passage_table
+
+
+def write_index(passages: pd.DataFrame, path: str | Path, jobs: int = 1) -> list[Path]:
+    paths = index_paths(path)
+    for table, table_path in zip(build_index(passages, jobs), paths):
+        with pa.ipc.new_file(table_path, table.schema) as writer:
+            writer.write_table(table)
+    return list(paths)
+
+
+class BM25Index:
+    def __init__(self, path: str | Path, k1: float = 1.2, b: float = 0.75):
+        # Both files are memory-mapped; only the passage length norms are
+        # computed on open.
+        terms_path, passages_path = index_paths(path)
+        terms = pa.ipc.open_file(pa.memory_map(str(terms_path))).read_all()
+        passages = pa.ipc.open_file(pa.memory_map(str(passages_path))).read_all()
+
+        self.terms = terms["term"].combine_chunks()
+        postings = terms["postings"].combine_chunks()
+        self.offsets = postings.offsets.to_numpy()
+        self.passages = postings.values.field("passage").to_numpy()
+        self.tfs = postings.values.field("tf").to_numpy()
+        self.passage_ids = passages["passage_id"].combine_chunks()
+
+        self.k1 = k1
+        lengths = passages["length"].to_numpy()
+        average = lengths.mean() if len(lengths) else 0.0
+        self.norms = k1 * (1 - b + b * lengths / max(average, 1.0))
+
+    def __len__(self) -> int:
+        return len(self.passage_ids)
+
+    def scores(self, query: str) -> np.ndarray:
+        tokens, _ = tokenize(pa.array([query], self.terms.type))
+        matched = pc.is_in(self.terms, value_set=pc.unique(tokens))
+        scores = np.zeros(len(self))
+        for term in np.flatnonzero(matched.to_numpy(zero_copy_only=False)):
+            start, end = self.offsets[term], self.offsets[term + 1]
+            passages = self.passages[start:end]
+            tf = self.tfs[start:end]
+            idf = np.log(1 + (len(self) - (end - start) + 0.5) / (end - start + 0.5))
+            scores[passages] += idf * tf * (self.k1 + 1) / (tf + self.norms[passages])
+        return scores
+
+    def search(self, query: str, k: int = 10) -> list[tuple[str, float]]:
+        # Top-k passages by score, ties broken by passage order.
+        scores = self.scores(query)
+        hits = np.flatnonzero(scores)
+        top = hits[np.lexsort((hits, -scores[hits]))[:k]]
+        return [(self.passage_ids[i].as_py(), float(scores[i])) for i in top]
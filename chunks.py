@@ -0,0 +1,148 @@
+from pathlib import Path
+from typing import Final
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+CHUNK_MODES: Final[tuple[str, ...]] = ("off", "paragraph", "sentence")
+
+NEWLINE: Final[int] = ord("\n")
+
+
+def byte_class(members: bytes) -> np.ndarray:
+    table = np.zeros(256, dtype=bool)
+    table[list(members)] = True
+    return table
+
+
+SENTENCE_ENDS: Final[np.ndarray] = byte_class(b".!?")
+WHITESPACE: Final[np.ndarray] = byte_class(b" \t\n")
+
+# Passages are chunked in blocks of about this many UTF-8 bytes, which bounds
+# the per-byte arrays.
+CHUNK_BLOCK_BYTES: Final[int] = 1 << 23
+
+
+def chunk_index_path(path: str | Path) -> Path:
+    path = Path(path)
+    return path.with_name(f"{path.name}.chunks.arrow")
+
+
+def break_levels(data: np.ndarray, offsets: np.ndarray, mode: str) -> list[np.ndarray]:
+    # Byte positions a chunk may end at, strongest first: after a blank line
+    # (between FinQA's pre_text, table and post_text), after a line break,
+    # and in sentence mode after a sentence's closing punctuation and space.
+    # Two-byte patterns must not span two passages.
+    continues = np.ones(len(data) + 1, dtype=bool)
+    continues[offsets] = False
+    newline = data == NEWLINE
+    levels = [
+        np.flatnonzero(newline[:-1] & newline[1:] & continues[1:-1]) + 2,
+        np.flatnonzero(newline) + 1,
+    ]
+    if mode == "sentence":
+        ends = SENTENCE_ENDS[data[:-1]]
+        spaces = WHITESPACE[data[1:]]
+        levels.append(np.flatnonzero(ends & spaces & continues[1:-1]) + 2)
+    return levels
+
+
+def chunk_offsets(
+    texts: pa.Array, mode: str, size: int
+) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    # All passages are chunked together on their concatenated UTF-8 buffer,
+    # one chunk of every unfinished passage per step. A chunk of up to `size`
+    # characters ends at the strongest break in the second half of its
+    # window, else at the last break in it, else at `size` characters.
+    texts = texts.cast(pa.large_string())
+    offsets = np.frombuffer(texts.buffers()[1], dtype=np.int64)
+    offsets = offsets[texts.offset : texts.offset + len(texts) + 1]
+    data = np.frombuffer(texts.buffers()[2] or b"", dtype=np.uint8)
+    data = data[offsets[0] : offsets[-1]]
+    offsets = offsets - offsets[0]
+
+    # Character position of every byte position, and the reverse.
+    lead = (data & 0xC0) != 0x80
+    chars = np.concatenate([[0], np.cumsum(lead)])
+    bytes_of = np.append(np.flatnonzero(lead), len(data))
+
+    levels = [chars[level] for level in break_levels(data, offsets, mode)]
+    levels.append(np.union1d(levels[1], levels[-1]))
+    floors = [max(size // 2, 1)] * (len(levels) - 1) + [1]
+
+    text_starts = chars[offsets[:-1]]
+    text_ends = chars[offsets[1:]]
+    position = text_starts.copy()
+    found_texts, found_starts, found_ends = [], [], []
+    active = np.flatnonzero(position < text_ends)
+    while len(active):
+        start = position[active]
+        limit = np.minimum(start + size, text_ends[active])
+        end = limit.copy()
+        open_ = limit < text_ends[active]
+        for level, floor in zip(levels, floors):
+            last = np.searchsorted(level, limit, side="right") - 1
+            candidate = level[np.maximum(last, 0)] if len(level) else limit
+            hit = open_ & (last >= 0) & (candidate >= start + floor)
+            end[hit] = candidate[hit]
+            open_ &= ~hit
+        found_texts.append(active)
+        found_starts.append(start)
+        found_ends.append(end)
+        position[active] = end
+        active = active[end < text_ends[active]]
+
+    text = np.concatenate(found_texts) if found_texts else np.zeros(0, np.int64)
+    starts = np.concatenate(found_starts) if found_starts else np.zeros(0, np.int64)
+    ends = np.concatenate(found_ends) if found_ends else np.zeros(0, np.int64)
+    order = np.lexsort((starts, text))
+    text, starts, ends = text[order], starts[order], ends[order]
+    byte_starts = bytes_of[starts] - offsets[text]
+    byte_ends = bytes_of[ends] - offsets[text]
+    return (
+        text,
+        starts - text_starts[text],
+        ends - text_starts[text],
+        byte_starts,
+        byte_ends,
+    )
+
+
+def build_chunk_index(passages: pd.DataFrame, mode: str, size: int) -> pa.Table:
+    texts = pa.array(passages["text"], pa.large_string(), from_pandas=True)
+    ends = np.cumsum(pc.binary_length(texts).to_numpy(zero_copy_only=False))
+    total = int(ends[-1]) if len(ends) else 0
+    cuts = np.searchsorted(
+        ends, np.arange(CHUNK_BLOCK_BYTES, total, CHUNK_BLOCK_BYTES), side="right"
+    )
+    bounds = np.unique([0, *cuts, len(texts)])
+
+    blocks = [
+        (lo, chunk_offsets(texts.slice(lo, hi - lo), mode, size))
+        for lo, hi in zip(bounds[:-1], bounds[1:])
+    ]
+    text = np.concatenate([np.zeros(0, np.int64)] + [lo + b[0] for lo, b in blocks])
+    columns = [
+        np.concatenate([np.zeros(0, np.int64)] + [b[i] for _, b in blocks])
+        for i in range(1, 5)
+    ]
+    first = np.searchsorted(text, text)
+    return pa.table(
+        {
+            "passage_id": pa.array(passages["passage_id"], pa.string()).take(text),
+            "chunk": pa.array(np.arange(len(text)) - first, pa.int32()),
+            **dict(zip(("char_start", "char_end", "byte_start", "byte_end"), columns)),
+        }
+    )
+
+
+def write_chunk_index(
+    passages: pd.DataFrame, path: str | Path, mode: str, size: int
+) -> Path:
+    table = build_chunk_index(passages, mode, size)
+    index_path = chunk_index_path(path)
+    with pa.ipc.new_file(index_path, table.schema) as writer:
+        writer.write_table(table)
+    return index_path
@@ -0,0 +1,278 @@
+import hashlib
+from collections import Counter
+from collections.abc import Mapping
+from dataclasses import dataclass
+from typing import Any, Final
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+DEDUP_POLICIES: Final[tuple[str, ...]] = ("off", "report", "keep-one", "drop")
+
+# Fixed so that the clusters found don't depend on --random-seed.
+MINHASH_SEED: Final[int] = 1
+
+# Shingles hashed per block; bounds the (shingles x permutations) matrix.
+MINHASH_BLOCK: Final[int] = 1 << 16
+
+MIX: Final = np.uint64(0x9E3779B97F4A7C15)
+
+WORD_SEPARATORS: Final[str] = r"[^\p{L}\p{M}\p{N}_]+"
+
+
+@dataclass(frozen=True, kw_only=True)
+class DedupConfig:
+    text_threshold: float = 0.8
+    question_threshold: float = 0.8
+    num_perm: int = 128
+    shingle_size: int = 3
+
+
+def tokenize(strings: pa.Array) -> tuple[pa.Array, np.ndarray]:
+    # Lowercased words of every string, with the row each came from. RE2's
+    # \w is ASCII-only, so words are runs of Unicode letters, marks, digits
+    # and underscores.
+    words = pc.split_pattern_regex(pc.utf8_lower(strings), WORD_SEPARATORS)
+    counts = pc.list_value_length(words).fill_null(0).to_numpy()
+    rows = np.repeat(np.arange(len(strings)), counts)
+    flat = words.flatten()
+    keep = pc.greater(pc.binary_length(flat), 0).to_numpy(zero_copy_only=False)
+    return flat.filter(pa.array(keep)), rows[keep]
+
+
+def word_hashes(strings: pa.Array) -> tuple[np.ndarray, np.ndarray]:
+    # Every word hashed by content, with the row it came from.
+    words, rows = tokenize(strings)
+    encoded = words.dictionary_encode()
+    vocabulary = np.array(
+        [
+            int.from_bytes(
+                hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest(), "little"
+            )
+            for word in encoded.dictionary.to_pylist()
+        ],
+        dtype=np.uint64,
+    )
+    return vocabulary[encoded.indices.to_numpy()], rows
+
+
+def shingles(strings: pa.Array, size: int) -> tuple[np.ndarray, np.ndarray]:
+    # Hashes of every run of `size` consecutive words; a string shorter than
+    # that gets one shingle of all its words.
+    words, rows = word_hashes(strings)
+    n = len(words)
+    positions = np.arange(n)
+    hashes = np.zeros(n, dtype=np.uint64)
+    for offset in range(size):
+        other = np.minimum(positions + offset, n - 1)
+        same = (positions + offset < n) & (rows[other] == rows)
+        hashes = hashes * MIX + np.where(same, words[other], np.uint64(0))
+
+    last = np.minimum(positions + size - 1, n - 1)
+    full = (positions + size - 1 < n) & (rows[last] == rows)
+    first = np.diff(rows, prepend=-1) != 0
+    valid = full | first
+    return hashes[valid], rows[valid]
+
+
+def minhash(strings: pa.Array, config: DedupConfig) -> np.ndarray:
+    rng = np.random.default_rng(MINHASH_SEED)
+    a = rng.integers(1, 1 << 63, config.num_perm, dtype=np.uint64) | np.uint64(1)
+    b = rng.integers(0, 1 << 63, config.num_perm, dtype=np.uint64)
+
+    hashes, rows = shingles(strings, config.shingle_size)
+    # Strings without words keep the all-ones signature and never match.
+    signatures = np.full((len(strings), config.num_perm), 0xFFFFFFFF, np.uint32)
+    starts = np.flatnonzero(np.diff(rows, prepend=-1))
+    lo = 0
+    while lo < len(starts):
+        hi = max(lo + 1, int(np.searchsorted(starts, starts[lo] + MINHASH_BLOCK)))
+        begin = starts[lo]
+        end = starts[hi] if hi < len(starts) else len(hashes)
+        # Multiply-shift hashing: the high 32 bits of a * x + b. Permutations
+        # run along the first axis so each row's minimum is a contiguous scan.
+        block = (a[:, None] * hashes[begin:end] + b[:, None]) >> np.uint64(32)
+        signatures[rows[starts[lo:hi]]] = np.minimum.reduceat(
+            block.astype(np.uint32), starts[lo:hi] - begin, axis=1
+        ).T
+        lo = hi
+    return signatures
+
+
+def signatures(values: pd.Series, config: DedupConfig) -> np.ndarray:
+    # Each distinct value is hashed once; missing values (code -1) pick up
+    # the all-ones row appended at the end.
+    codes, uniques = pd.factorize(values)
+    strings = pa.array(uniques, from_pandas=True)
+    if pa.types.is_dictionary(strings.type):
+        strings = strings.dictionary_decode()
+    strings = strings.cast(pa.large_string())
+    unique_signatures = minhash(strings, config)
+    empty = np.full((1, config.num_perm), 0xFFFFFFFF, np.uint32)
+    return np.concatenate([unique_signatures, empty])[codes]
+
+
+def lsh_bands(threshold: float, num_perm: int) -> tuple[int, int]:
+    # Bands x rows splitting the signature so that pairs at the threshold
+    # are likely to share a bucket: the S-curve midpoint (1/b)^(1/r) is the
+    # largest one not above it.
+    splits = [(b, num_perm // b) for b in range(1, num_perm + 1) if num_perm % b == 0]
+    below = [split for split in splits if (1 / split[0]) ** (1 / split[1]) <= threshold]
+    return max(below or splits[-1:], key=lambda s: (1 / s[0]) ** (1 / s[1]))
+
+
+def similarity(signatures: np.ndarray, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    return (signatures[a] == signatures[b]).mean(axis=1)
+
+
+def connected(n: int, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    # Label of the smallest row in each component, by min-label propagation
+    # and pointer jumping.
+    labels = np.arange(n)
+    while True:
+        low = np.minimum(labels[a], labels[b])
+        updated = labels.copy()
+        np.minimum.at(updated, a, low)
+        np.minimum.at(updated, b, low)
+        updated = updated[updated]
+        if np.array_equal(updated, labels):
+            return labels
+        labels = updated
+
+
+def band_keys(
+    signatures: np.ndarray, band: int, rows: int, weights: np.ndarray
+) -> np.ndarray:
+    columns = signatures[:, band * rows : (band + 1) * rows]
+    return (columns.astype(np.uint64) * weights).sum(axis=1)
+
+
+def star_pairs(keys: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    # Positions of every row sharing a key and of the first row with it.
+    # Codes are numbered in order of first appearance, so a row is the
+    # first with its key when its code exceeds every earlier one.
+    codes, _ = pd.factorize(keys)
+    seen = np.maximum.accumulate(np.concatenate([[-1], codes[:-1]]))
+    first = np.flatnonzero(codes > seen)[codes]
+    shared = first != np.arange(len(codes))
+    return first[shared], np.flatnonzero(shared)
+
+
+def find_clusters(
+    texts: pd.Series, questions: pd.Series, config: DedupConfig
+) -> np.ndarray:
+    # Candidates share an LSH bucket of the text signature and one of the
+    # question signature; a candidate is kept when both estimated Jaccard
+    # similarities reach their thresholds. Bucketing on both means a row
+    # whose passage matches but whose question doesn't can't hide the pairs
+    # behind it, as happens to FinQA filings asked several ways.
+    text_signatures = signatures(texts, config)
+    question_signatures = signatures(questions, config)
+    n = len(text_signatures)
+    has_words = (text_signatures != 0xFFFFFFFF).any(axis=1)
+
+    text_bands, text_rows = lsh_bands(config.text_threshold, config.num_perm)
+    question_bands, question_rows = lsh_bands(
+        config.question_threshold, config.num_perm
+    )
+    weights = np.random.default_rng(MINHASH_SEED).integers(
+        1, 1 << 63, max(text_rows, question_rows), dtype=np.uint64
+    )
+    question_keys = [
+        band_keys(question_signatures, band, question_rows, weights[:question_rows])
+        for band in range(question_bands)
+    ]
+    pairs_a, pairs_b = [], []
+    candidates = np.flatnonzero(has_words)
+    for band in range(text_bands):
+        keys = band_keys(
+            text_signatures[candidates], band, text_rows, weights[:text_rows]
+        )
+        codes, _ = pd.factorize(keys)
+        # Only rows sharing a text bucket are bucketed on their question.
+        shared = np.bincount(codes)[codes] > 1
+        members = candidates[shared]
+        text_codes = codes[shared].astype(np.uint64)
+        for keys in question_keys:
+            a, b = star_pairs(text_codes * MIX + keys[members])
+            pairs_a.append(members[a])
+            pairs_b.append(members[b])
+
+    a = np.concatenate(pairs_a) if pairs_a else np.zeros(0, dtype=np.int64)
+    b = np.concatenate(pairs_b) if pairs_b else np.zeros(0, dtype=np.int64)
+    # The same pair turns up in many bands; it is compared once.
+    a, b = np.divmod(np.unique(a * n + b), n)
+    match = (similarity(text_signatures, a, b) >= config.text_threshold) & (
+        similarity(question_signatures, a, b) >= config.question_threshold
+    )
+    return connected(n, a[match], b[match])
+
+
+def deduplicate(
+    sources: Mapping[str, pd.DataFrame], config: DedupConfig, policy: str
+) -> tuple[dict[str, pd.DataFrame], list[dict[str, Any]]]:
+    # Clusters may span domains. keep-one keeps each cluster's first row in
+    # source order, drop removes every row of a cluster, report keeps all.
+    names = list(sources)
+    frames = [sources[name] for name in names]
+    domain_of = np.repeat(np.arange(len(frames)), [len(df) for df in frames])
+    row_of = np.concatenate([np.arange(len(df)) for df in frames])
+    texts = pd.concat([df["text"] for df in frames], ignore_index=True)
+    questions = pd.concat([df["question"] for df in frames], ignore_index=True)
+
+    labels = find_clusters(texts, questions, config)
+    sizes = np.bincount(labels, minlength=len(labels))
+    clustered = sizes[labels] > 1
+    match policy:
+        case "report":
+            keep = np.ones(len(labels), dtype=bool)
+        case "keep-one":
+            keep = ~clustered | (labels == np.arange(len(labels)))
+        case "drop":
+            keep = ~clustered
+        case _:
+            raise ValueError(f"Unknown dedup policy: {policy}")
+
+    kept = {
+        name: df.iloc[row_of[(domain_of == i) & keep]].reset_index(drop=True)
+        for i, (name, df) in enumerate(zip(names, frames))
+    }
+    clusters = cluster_report(labels, clustered, keep, names, frames, domain_of, row_of)
+    return kept, clusters
+
+
+def cluster_report(
+    labels: np.ndarray,
+    clustered: np.ndarray,
+    keep: np.ndarray,
+    names: list[str],
+    frames: list[pd.DataFrame],
+    domain_of: np.ndarray,
+    row_of: np.ndarray,
+) -> list[dict[str, Any]]:
+    members: dict[int, list[int]] = {}
+    for i in np.flatnonzero(clustered):
+        members.setdefault(int(labels[i]), []).append(int(i))
+
+    clusters = []
+    for rows in members.values():
+        entries = []
+        for i in rows:
+            df = frames[domain_of[i]]
+            entries.append(
+                {
+                    "domain": names[domain_of[i]],
+                    "task_id": str(df["task_id"].iloc[row_of[i]]),
+                    "row": int(row_of[i]),
+                    "question": str(df["question"].iloc[row_of[i]]),
+                    "kept": bool(keep[i]),
+                }
+            )
+        domains = Counter(entry["domain"] for entry in entries)
+        clusters.append(
+            {"size": len(entries), "domains": dict(domains), "rows": entries}
+        )
+    clusters.sort(key=lambda cluster: -cluster["size"])
+    return clusters
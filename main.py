@@ -1,12 +1,40 @@
+import cProfile
+import hashlib
 import json
+import math
+import os
+import queue
 import random
-from argparse import ArgumentParser
-from dataclasses import dataclass
+import re
+import resource
+import threading
+import time
+from argparse import ArgumentParser, ArgumentTypeError, Namespace
+from collections import Counter
+from collections.abc import Callable, Iterable, Iterator, Mapping, Sequence
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from json.encoder import encode_basestring_ascii
 from pathlib import Path
 from typing import Any, Final
 
+import numpy as np
 import pandas as pd
-from datasets import load_dataset
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv
+import pyarrow.parquet as pq
+
+from bm25 import write_index
+from chunks import CHUNK_MODES, write_chunk_index
+from dedup import DEDUP_POLICIES, DedupConfig, deduplicate
+from reader import (
+    ANSWERS_TYPE,
+    manifest_path,
+    normalized_paths,
+    shard_path,
+    variant_path,
+)
 
 
 @dataclass(frozen=True, kw_only=True)
@@ -17,10 +45,163 @@ class Task:
     answers: list[tuple[str, str]]
 
 
+@dataclass(frozen=True, kw_only=True)
+class LoadConfig:
+    random_seed: int
+    table_style: str = "pipe"
+    finqa_splits: tuple[str, ...] = ("test",)
+    mctest_sets: tuple[str, ...] = ("mc500",)
+    mctest_splits: tuple[str, ...] = ("test",)
+
+
 def maud(task: str) -> Path:
     return Path("./legalbench/data") / f"maud_{task}"
 
 
+PUBMEDQA: Final[tuple[str, str]] = ("qiaojin/PubMedQA", "pqa_labeled")
+PUBMEDQA_SNAPSHOT: Final[Path] = Path("./pubmedqa/pqa_labeled.arrow")
+FINQA_DIR: Final[Path] = Path("./FinQA/dataset")
+FINQA_SPLITS: Final[tuple[str, ...]] = ("train", "dev", "test")
+MCTEST_DIR: Final[Path] = Path("./mctest/data")
+MCTEST_SETS: Final[tuple[str, ...]] = ("mc160", "mc500")
+MCTEST_SPLITS: Final[tuple[str, ...]] = ("train", "dev", "test")
+
+STREAM_CHUNK_SIZE: Final[int] = 1024
+JSON_READ_SIZE: Final[int] = 1 << 16
+# Parsed batches buffered per FinQA split before its reader thread blocks.
+FINQA_QUEUE_SIZE: Final[int] = 2
+
+# Warnings counted by category in this process; measure() reports the ones
+# raised during a stage, so counts survive loaders run in worker processes.
+EVENTS: Counter[str] = Counter()
+EVENTS_LOCK: Final[threading.Lock] = threading.Lock()
+
+
+def warn(category: str, message: str) -> None:
+    with EVENTS_LOCK:
+        EVENTS[category] += 1
+        print(f"WARN: {message}")
+
+
+# Peak RSS of this process before the high-water mark was last reset, which
+# also lowers ru_maxrss.
+PEAK_RSS_BEFORE_RESET_KIB = 0
+
+
+def reset_peak_rss() -> bool:
+    # Writing 5 to clear_refs resets the kernel's RSS high-water mark (Linux
+    # 4.0+), so VmHWM afterwards is the peak since the reset.
+    global PEAK_RSS_BEFORE_RESET_KIB
+    peak = process_peak_rss_kib()
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        return False
+    PEAK_RSS_BEFORE_RESET_KIB = peak
+    return True
+
+
+def process_peak_rss_kib() -> int:
+    # ru_maxrss is in KiB on Linux.
+    return max(
+        PEAK_RSS_BEFORE_RESET_KIB, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    )
+
+
+def peak_rss_kib() -> int | None:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def measure(
+    stage: str, profile_dir: Path | None, fn: Callable[..., Any], *args: Any
+) -> tuple[Any, dict[str, Any], Counter[str]]:
+    with EVENTS_LOCK:
+        events = EVENTS.copy()
+    reset = reset_peak_rss()
+    profiler = cProfile.Profile() if profile_dir is not None else None
+    wall, cpu = time.perf_counter(), time.process_time()
+    if profiler is not None:
+        profiler.enable()
+    try:
+        result = fn(*args)
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profile_dir.mkdir(parents=True, exist_ok=True)
+            profiler.dump_stats(profile_dir / f"{stage.replace(':', '-')}.prof")
+
+    record: dict[str, Any] = {
+        "wall_seconds": time.perf_counter() - wall,
+        "cpu_seconds": time.process_time() - cpu,
+    }
+    peak = peak_rss_kib() if reset else None
+    if peak is not None:
+        record["peak_rss_mib"] = peak / 1024
+    else:
+        # Without a reset only the process's peak so far is known.
+        record["process_peak_rss_mib"] = process_peak_rss_kib() / 1024
+    record["pid"] = os.getpid()
+    if isinstance(result, pd.DataFrame):
+        record["rows_out"] = len(result)
+    with EVENTS_LOCK:
+        return result, record, EVENTS - events
+
+
+@dataclass(kw_only=True)
+class RunMetrics:
+    profile_dir: Path | None = None
+    stages: dict[str, dict[str, Any]] = field(default_factory=dict)
+    events: Counter[str] = field(default_factory=Counter)
+    started: tuple[float, float] = field(
+        default_factory=lambda: (time.perf_counter(), time.process_time())
+    )
+
+    def add(self, stage: str, measured: tuple[Any, dict[str, Any], Counter[str]]):
+        result, record, events = measured
+        self.stages[stage] = record
+        self.events.update(events)
+        return result
+
+    def run(self, stage: str, fn: Callable[..., Any], *args: Any) -> Any:
+        return self.add(stage, measure(stage, self.profile_dir, fn, *args))
+
+    def report(self) -> dict[str, Any]:
+        wall, cpu = self.started
+        # Worker processes count once they have exited, at the end of the run.
+        # Their own resets lower the peak they report on exit, so the peaks
+        # of the stages they ran count too.
+        children = resource.getrusage(resource.RUSAGE_CHILDREN)
+        stage_peaks = [record.get("peak_rss_mib", 0) for record in self.stages.values()]
+        return {
+            "total": {
+                "wall_seconds": time.perf_counter() - wall,
+                "cpu_seconds": time.process_time()
+                - cpu
+                + children.ru_utime
+                + children.ru_stime,
+                "peak_rss_mib": max(
+                    max(process_peak_rss_kib(), children.ru_maxrss) / 1024,
+                    *stage_peaks,
+                ),
+            },
+            "stages": self.stages,
+            "events": dict(sorted(self.events.items())),
+            "dropped_finqa_records": sum(
+                n
+                for category, n in self.events.items()
+                if category.startswith("finqa.")
+            ),
+        }
+
+
 MAUD_TASKS: Final[dict[str, Task]] = {
     "t1": Task(
         name="t1",
@@ -438,87 +619,154 @@ MAUD_TASKS: Final[dict[str, Task]] = {
 }
 
 
-def format_table_as_text(table: list[list[str]]) -> str:
-    if not table:
-        return ""
+def clean_table(table: Iterable[Iterable[Any]]) -> list[list[str]]:
+    return [[str(cell).strip() for cell in row] for row in table]
 
-    cleaned_table = []
-    for row in table:
-        cleaned_row = []
-        for cell in row:
-            cell_str = str(cell).strip()
-            cleaned_row.append(cell_str)
-        cleaned_table.append(cleaned_row)
 
-    if not cleaned_table:
-        return ""
+def pipe_table(table: list[list[Any]]) -> str:
+    # Only the columns of the first row are padded and underlined. Tables
+    # whose rows all have that many cells are laid out as one format string.
+    n = len(table[0])
+    if any(len(row) != n for row in table):
+        return ragged_pipe_table(clean_table(table), n)
+    cells = [str(cell).strip() for row in table for cell in row]
+    widths = [max(map(len, cells[i::n])) for i in range(n)]
+    lines = [" | ".join([f"%-{w}s" for w in widths])] * len(table)
+    if len(table) > 1:
+        lines.insert(1, " | ".join(["-" * w for w in widths]))
+    return "\n".join(lines) % tuple(cells)
 
-    col_widths = []
-    for col_idx in range(len(cleaned_table[0])):
-        max_width = 0
-        for row in cleaned_table:
-            if col_idx < len(row):
-                max_width = max(max_width, len(row[col_idx]))
-        col_widths.append(max_width)
-
-    formatted_lines = []
-    for i, row in enumerate(cleaned_table):
-        # Pad each cell to its column width
-        padded_cells = []
-        for j, cell in enumerate(row):
-            if j < len(col_widths):
-                padded_cells.append(cell.ljust(col_widths[j]))
-            else:
-                padded_cells.append(cell)
 
-        formatted_line = " | ".join(padded_cells)
-        formatted_lines.append(formatted_line)
+def ragged_pipe_table(rows: list[list[str]], n: int) -> str:
+    widths = [max(len(row[i]) for row in rows if i < len(row)) for i in range(n)]
+    lines = [" | ".join([*map(str.ljust, row, widths), *row[n:]]) for row in rows]
+    if len(rows) > 1:
+        lines.insert(1, " | ".join(["-" * w for w in widths]))
+    return "\n".join(lines)
 
-        if i == 0 and len(cleaned_table) > 1:
-            separator = " | ".join(["-" * width for width in col_widths])
-            formatted_lines.append(separator)
 
-    return "\n".join(formatted_lines)
+def markdown_table(table: list[list[Any]]) -> str:
+    rows = clean_table(table)
+    n = max(map(len, rows))
+    lines = []
+    for row in rows:
+        cells = [cell.replace("|", "\\|") for cell in row] + [""] * (n - len(row))
+        lines.append(f"| {' | '.join(cells)} |")
+    lines.insert(1, f"| {' | '.join(['---'] * n)} |")
+    return "\n".join(lines)
 
 
-def generate_plausible_answers(
-    correct_answer: float, question: str
-) -> list[tuple[str, str]]:
-    variations = [
-        round(correct_answer * 0.8, 1),
-        round(correct_answer * 1.2, 1),
-        round(correct_answer * 0.5, 1),
-        round(correct_answer * 1.5, 1),
-        round(correct_answer + 10, 1),
-        round(correct_answer - 10, 1),
-        round(correct_answer * -1, 1),
-    ]
-    variations = [v for v in set(variations) if v != correct_answer and v != 0]
+def tsv_table(table: list[list[Any]]) -> str:
+    return "\n".join(
+        "\t".join(" ".join(cell.split()) for cell in row) for row in clean_table(table)
+    )
 
-    wrong_answers = random.sample(variations, min(3, len(variations)))
 
-    while len(wrong_answers) < 3:
-        if "percent" in question.lower() or "%" in question.lower():
-            wrong_answers.append(round(correct_answer + random.uniform(-20, 20), 1))
-        else:
-            wrong_answers.append(round(correct_answer + random.uniform(-50, 50), 1))
+TABLE_STYLES: Final[dict[str, Callable[[list[list[Any]]], str]]] = {
+    "pipe": pipe_table,
+    "markdown": markdown_table,
+    "tsv": tsv_table,
+}
 
-    all_answers = [correct_answer] + wrong_answers[:3]
-    random.shuffle(all_answers)
 
-    letters = ["A", "B", "C", "D"]
-    answer_choices = [(letters[i], str(all_answers[i])) for i in range(4)]
+def format_table_as_text(
+    table: list[list[Any]],
+    style: str = "pipe",
+    rendered: dict[str, tuple[list[list[Any]], str]] | None = None,
+) -> str:
+    # `rendered` memoizes by content for one load: questions about the same
+    # filing share its table. The key joins the cells with control
+    # characters, and a hit is only reused when the table is equal, so cells
+    # containing them can't alias another table.
+    if not table:
+        return ""
+    if rendered is None:
+        return TABLE_STYLES[style](table)
+    try:
+        key = "\x1e".join([style, *map("\x1f".join, table)])
+    except TypeError:
+        # Cells that aren't strings, which the JSON sources never have.
+        return TABLE_STYLES[style](table)
+    hit = rendered.get(key)
+    if hit is not None and hit[0] == table:
+        return hit[1]
+    text = TABLE_STYLES[style](table)
+    rendered[key] = (table, text)
+    return text
+
+
+def splitmix64(x: np.ndarray) -> np.ndarray:
+    x = x ^ (x >> np.uint64(30))
+    x = x * np.uint64(0xBF58476D1CE4E5B9)
+    x = x ^ (x >> np.uint64(27))
+    x = x * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def record_uniforms(record_ids: Iterable[str], random_seed: int, n: int) -> np.ndarray:
+    keys = np.array(
+        [
+            int.from_bytes(
+                hashlib.blake2b(
+                    f"{random_seed}:{record_id}".encode("utf-8"), digest_size=8
+                ).digest()
+            )
+            for record_id in record_ids
+        ],
+        dtype=np.uint64,
+    )
+    counters = np.arange(1, n + 1, dtype=np.uint64) * np.uint64(0x9E3779B97F4A7C15)
+    bits = splitmix64(keys[:, None] + counters)
+    return (bits >> np.uint64(11)).astype(np.float64) * 2.0**-53
 
-    correct_letter = None
-    for letter, value in answer_choices:
-        if float(value) == correct_answer:
-            correct_letter = letter
-            break
 
-    return answer_choices, correct_letter
+def generate_plausible_answers(
+    correct_answers: np.ndarray, questions: pd.Series, uniforms: np.ndarray
+) -> tuple[list[str], np.ndarray]:
+    c = correct_answers[:, None]
+    variations = np.round(
+        np.hstack([c * 0.8, c * 1.2, c * 0.5, c * 1.5, c + 10, c - 10, c * -1]), 1
+    )
+    valid = (variations != c) & (variations != 0)
+    for j in range(1, variations.shape[1]):
+        valid[:, j] &= (variations[:, :j] != variations[:, j : j + 1]).all(axis=1)
+
+    # Up to three distinct variations in random order, then random offsets
+    # for whatever is left.
+    picks = np.argsort(np.where(valid, uniforms[:, :7], 2.0), axis=1)[:, :3]
+    spread = np.where(
+        questions.str.lower().str.contains("percent|%", regex=True), 20.0, 50.0
+    )[:, None]
+    offsets = np.round(c + (uniforms[:, 7:10] * 2 - 1) * spread, 1)
+    wrong_answers = np.where(
+        np.take_along_axis(valid, picks, axis=1),
+        np.take_along_axis(variations, picks, axis=1),
+        offsets,
+    )
 
+    order = np.argsort(uniforms[:, 10:14], axis=1)
+    all_answers = np.take_along_axis(np.hstack([c, wrong_answers]), order, axis=1)
+    correct_letters = np.array(list("ABCD"))[np.argmax(order == 0, axis=1)]
 
-def process_finqa_record(record: dict[str, Any]) -> dict[str, Any] | None:
+    answer_choices = [
+        json.dumps([(letter, str(value)) for letter, value in zip("ABCD", row)])
+        for row in all_answers.tolist()
+    ]
+    return answer_choices, correct_letters
+
+
+FINQA_DROP_REASONS: Final[dict[type[Exception], str]] = {
+    KeyError: "missing_answer",
+    TypeError: "non_numeric_answer",
+    ValueError: "invalid_answer",
+}
+
+
+def parse_finqa_record(
+    record: dict[str, Any],
+    table_style: str = "pipe",
+    rendered: dict[str, tuple[list[list[Any]], str]] | None = None,
+) -> dict[str, Any] | None:
     pre_text = record.get("pre_text", [])
     post_text = record.get("post_text", [])
     table = record.get("table", [])
@@ -530,7 +778,7 @@ def process_finqa_record(record: dict[str, Any]) -> dict[str, Any] | None:
         text_parts.extend(pre_text)
         text_parts.append("")
     if table:
-        text_parts.append(format_table_as_text(table))
+        text_parts.append(format_table_as_text(table, table_style, rendered))
         text_parts.append("")
     if post_text:
         text_parts.extend(post_text)
@@ -540,209 +788,1773 @@ def process_finqa_record(record: dict[str, Any]) -> dict[str, Any] | None:
 
     try:
         if not qa["answer"]:
+            if not isinstance(qa["exe_ans"], int | float):
+                raise TypeError(f"non-numeric exe_ans {qa['exe_ans']!r}")
             correct_answer = qa["exe_ans"] * 100
-            answer_choices, correct_letter = generate_plausible_answers(
-                correct_answer, question
-            )
+        elif qa["answer"] in ("yes", "no"):
+            correct_answer = None
         else:
-            if qa["answer"] in ("yes", "no"):
-                answer_choices = [("A", "yes"), ("B", "no")]
-                correct_letter = 0 if qa["answer"] == "yes" else 1
-            else:
-                correct_answer = float(qa.get("answer", 0).replace("%", ""))
-                answer_choices, correct_letter = generate_plausible_answers(
-                    correct_answer, question
-                )
+            correct_answer = float(qa.get("answer", 0).replace("%", ""))
+        if correct_answer is not None and not np.isfinite(correct_answer):
+            raise ValueError(f"non-finite answer {correct_answer}")
     except Exception as e:
-        print(f"WARN: {e}")
+        reason = FINQA_DROP_REASONS.get(type(e), "invalid_record")
+        warn(f"finqa.{reason}", f"dropping FinQA record {record.get('id')}: {e}")
         return None
 
     return {
-        "domain": "finance",
-        "task_id": "finqa",
+        "id": record.get("id", question),
         "text": formatted_text,
         "question": question,
-        "answers": json.dumps(answer_choices),
-        "answer": correct_letter,
+        "correct_answer": correct_answer,
+        "yes_no": qa["answer"] if correct_answer is None else None,
     }
 
 
-def prep_legal() -> pd.DataFrame:
-    dfs = []
+FINQA_BASE_COLUMNS: Final[tuple[str, ...]] = (
+    "id",
+    "text",
+    "question",
+    "correct_answer",
+    "yes_no",
+)
+
+
+def finqa_base_frame(parsed: list[dict[str, Any]]) -> pd.DataFrame:
+    # Carries domain and task_id so the base frame can be deduplicated.
+    df = pd.DataFrame(parsed, columns=list(FINQA_BASE_COLUMNS))
+    df.insert(0, "domain", "finance")
+    df.insert(1, "task_id", "finqa")
+    return df
+
+
+def add_finqa_answers(df: pd.DataFrame, random_seed: int) -> pd.DataFrame:
+    # The only seeded part of a FinQA frame: the distractors and the letter
+    # order of numeric questions.
+    answers = pd.Series(json.dumps([("A", "yes"), ("B", "no")]), index=df.index)
+    answer = df["yes_no"].map({"yes": "A", "no": "B"})
+
+    numeric = df["yes_no"].isna().to_numpy()
+    if numeric.any():
+        choices, letters = generate_plausible_answers(
+            df.loc[numeric, "correct_answer"].to_numpy(dtype=np.float64),
+            df.loc[numeric, "question"],
+            # 7 variation keys, 3 fallback offsets and 4 shuffle keys per record.
+            record_uniforms(df.loc[numeric, "id"], random_seed, 14),
+        )
+        answers[numeric] = choices
+        answer[numeric] = letters
+
+    return pd.DataFrame(
+        {
+            "domain": df["domain"],
+            "task_id": df["task_id"],
+            "text": df["text"],
+            "question": df["question"],
+            "answers": answers,
+            "answer": answer,
+        }
+    )
+
+
+def finqa_frame(parsed: list[dict[str, Any]], random_seed: int) -> pd.DataFrame:
+    return add_finqa_answers(finqa_base_frame(parsed), random_seed)
+
+
+def read_maud_task(task_name: str, task: Task) -> pd.DataFrame:
+    df = pa.csv.read_csv(
+        task.path / "test.tsv",
+        parse_options=pa.csv.ParseOptions(delimiter="\t", newlines_in_values=True),
+        convert_options=pa.csv.ConvertOptions(
+            column_types={"answer": pa.string(), "text": pa.string()},
+            include_columns=["answer", "text"],
+        ),
+    ).to_pandas()
+    df["domain"] = "legal"
+    df["task_id"] = f"maud:{task_name}"
+    df["question"] = task.question
+    df["answers"] = json.dumps(task.answers)
+    return df
+
+
+def load_legal_parts(config: LoadConfig, parts: list[str]) -> list[pd.DataFrame]:
+    # Arrow's CSV reader releases the GIL, so the task files are read in parallel.
+    names = [part.removeprefix("maud:") for part in parts]
+    with ThreadPoolExecutor() as pool:
+        return list(
+            pool.map(read_maud_task, names, (MAUD_TASKS[name] for name in names))
+        )
+
+
+def prep_legal(config: LoadConfig) -> pd.DataFrame:
+    dfs = load_legal_parts(config, [f"maud:{task_name}" for task_name in MAUD_TASKS])
+    return pd.concat(dfs, axis=0, ignore_index=True)
+
+
+def iter_legal(config: LoadConfig) -> Iterator[dict[str, Any]]:
     for task_name, task in MAUD_TASKS.items():
-        df = pd.read_csv(task.path / "test.tsv", sep="\t", index_col="index")
-        df["domain"] = "legal"
-        df["task_id"] = f"maud:{task_name}"
-        df["question"] = task.question
-        df["answers"] = json.dumps(task.answers)
-        dfs.append(df)
-
-    maud_df = pd.concat(dfs, axis=0)
-    maud_df.reset_index(drop=True, inplace=True)
-
-    return maud_df
-
-
-def prep_medical() -> pd.DataFrame:
-    ds = load_dataset("qiaojin/PubMedQA", "pqa_labeled")["train"]
-    df = ds.to_pandas()[["pubid", "context", "question", "final_decision"]]
-
-    def map_to_answer(decision: str) -> str:
-        match decision:
-            case "yes":
-                return "A"
-            case "no":
-                return "B"
-            case "maybe":
-                return "C"
-            case _:
-                raise KeyError("Invalid decision")
+        chunks = pd.read_csv(
+            task.path / "test.tsv",
+            sep="\t",
+            index_col="index",
+            chunksize=STREAM_CHUNK_SIZE,
+        )
+        for df in chunks:
+            df["domain"] = "legal"
+            df["task_id"] = f"maud:{task_name}"
+            df["question"] = task.question
+            df["answers"] = json.dumps(task.answers)
+            yield from df.to_dict("records")
+
+
+PUBMEDQA_ANSWERS: Final[list[tuple[str, str]]] = [
+    ("A", "yes"),
+    ("B", "no"),
+    ("C", "maybe"),
+]
+
+
+def map_to_answer(decision: str) -> str:
+    match decision:
+        case "yes":
+            return "A"
+        case "no":
+            return "B"
+        case "maybe":
+            return "C"
+        case _:
+            raise KeyError("Invalid decision")
+
+
+def read_pubmedqa() -> pa.Table:
+    # The hub dataset is fetched once and kept as an uncompressed Arrow file,
+    # which later runs memory-map without importing datasets.
+    if PUBMEDQA_SNAPSHOT.exists():
+        return pa.ipc.open_file(pa.memory_map(str(PUBMEDQA_SNAPSHOT))).read_all()
+
+    from datasets import load_dataset
+
+    data = load_dataset(*PUBMEDQA)["train"].with_format("arrow")[:]
+    table = pa.table(
+        {
+            "pubid": data["pubid"],
+            "contexts": pc.struct_field(data["context"], "contexts"),
+            "question": data["question"],
+            "final_decision": data["final_decision"],
+        }
+    )
+
+    PUBMEDQA_SNAPSHOT.parent.mkdir(parents=True, exist_ok=True)
+    tmp = PUBMEDQA_SNAPSHOT.with_name(f".{PUBMEDQA_SNAPSHOT.name}.{os.getpid()}")
+    with pa.ipc.new_file(tmp, table.schema) as writer:
+        writer.write_table(table)
+    tmp.replace(PUBMEDQA_SNAPSHOT)
+    return table
+
+
+def prep_medical(config: LoadConfig) -> pd.DataFrame:
+    table = read_pubmedqa()
 
     return pd.DataFrame(
         {
             "domain": "medical",
             "task_id": "pubmedqa",
-            "text": df.apply(lambda row: "\n".join(row["context"]["contexts"]), axis=1),
-            "question": df["question"],
-            "answers": json.dumps([("A", "yes"), ("B", "no"), ("C", "maybe")]),
-            "answer": df["final_decision"].map(map_to_answer),
+            "text": pc.binary_join(table["contexts"], "\n").to_pandas(),
+            "question": table["question"].to_pandas(),
+            "answers": json.dumps(PUBMEDQA_ANSWERS),
+            "answer": table["final_decision"].to_pandas().map(map_to_answer),
+        }
+    )
+
+
+def iter_medical(config: LoadConfig) -> Iterator[dict[str, Any]]:
+    table = read_pubmedqa().select(["contexts", "question", "final_decision"])
+    answers = json.dumps(PUBMEDQA_ANSWERS)
+    for batch in table.to_batches(STREAM_CHUNK_SIZE):
+        for row in batch.to_pylist():
+            yield {
+                "domain": "medical",
+                "task_id": "pubmedqa",
+                "text": "\n".join(row["contexts"]),
+                "question": row["question"],
+                "answers": answers,
+                "answer": map_to_answer(row["final_decision"]),
+            }
+
+
+def finqa_path(split: str) -> Path:
+    return FINQA_DIR / f"{split}.json"
+
+
+JSON_SEPARATORS: Final[re.Pattern[str]] = re.compile(r"[\s,]*")
+
+
+def iter_json_array(path: Path) -> Iterator[Any]:
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8") as f:
+        buf = ""
+        while not buf and (chunk := f.read(JSON_READ_SIZE)):
+            buf = chunk.lstrip()
+        if not buf.startswith("["):
+            raise ValueError(f"{path}: expected a JSON array")
+        pos, eof = 1, False
+        while True:
+            pos = JSON_SEPARATORS.match(buf, pos).end()
+            value = None
+            if pos < len(buf):
+                if buf[pos] == "]":
+                    return
+                try:
+                    value, end = decoder.raw_decode(buf, pos)
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                else:
+                    # A value running to the end of the buffer may be truncated.
+                    if end < len(buf) or eof:
+                        yield value
+                        pos = end
+                        continue
+            if eof:
+                raise ValueError(f"{path}: unterminated JSON array")
+            chunk = f.read(JSON_READ_SIZE)
+            buf, pos, eof = buf[pos:] + chunk, 0, not chunk
+
+
+def read_finqa_split(
+    split: str,
+    table_style: str,
+    batches: queue.Queue[list[dict[str, Any]] | None],
+    stop: threading.Event,
+) -> None:
+    try:
+        batch = []
+        rendered: dict[str, tuple[list[list[Any]], str]] = {}
+        for record in iter_json_array(finqa_path(split)):
+            if stop.is_set():
+                return
+            parsed = parse_finqa_record(record, table_style, rendered)
+            if parsed is not None:
+                batch.append(parsed)
+            if len(batch) == STREAM_CHUNK_SIZE:
+                batches.put(batch)
+                batch = []
+        batches.put(batch)
+    finally:
+        batches.put(None)
+
+
+def iter_finqa_batches(config: LoadConfig) -> Iterator[list[dict[str, Any]]]:
+    # Every split is parsed on its own thread; batches are taken round-robin
+    # in split order so the record order does not depend on thread timing.
+    splits = config.finqa_splits
+    queues = [queue.Queue(maxsize=FINQA_QUEUE_SIZE) for _ in splits]
+    stop = threading.Event()
+    with ThreadPoolExecutor(max_workers=len(splits)) as pool:
+        futures = [
+            pool.submit(read_finqa_split, split, config.table_style, batches, stop)
+            for split, batches in zip(splits, queues)
+        ]
+        pending = list(range(len(splits)))
+        try:
+            while pending:
+                for i in list(pending):
+                    batch = queues[i].get()
+                    if batch is None:
+                        pending.remove(i)
+                        futures[i].result()
+                    else:
+                        yield batch
+        finally:
+            stop.set()
+            for i in pending:
+                while queues[i].get() is not None:
+                    pass
+
+
+def iter_financial(config: LoadConfig) -> Iterator[dict[str, Any]]:
+    for batch in iter_finqa_batches(config):
+        yield from finqa_frame(batch, config.random_seed).to_dict("records")
+
+
+def prep_financial(config: LoadConfig) -> pd.DataFrame:
+    return pd.concat(
+        [
+            finqa_frame(batch, config.random_seed)
+            for batch in iter_finqa_batches(config)
+        ],
+        ignore_index=True,
+    )
+
+
+def prep_financial_base(config: LoadConfig) -> pd.DataFrame:
+    return pd.concat(
+        [finqa_base_frame(batch) for batch in iter_finqa_batches(config)],
+        ignore_index=True,
+    )
+
+
+def mctest_paths(name: str, split: str) -> tuple[Path, Path]:
+    return (
+        MCTEST_DIR / "MCTest" / f"{name}.{split}.tsv",
+        MCTEST_DIR / "MCTestAnswers" / f"{name}.{split}.ans",
+    )
+
+
+def read_mctest_table(path: Path, columns: int) -> pa.Table:
+    # Tab-separated without quoting; story text escapes its own newlines.
+    names = [str(i) for i in range(columns)]
+    return pa.csv.read_csv(
+        path,
+        read_options=pa.csv.ReadOptions(column_names=names),
+        parse_options=pa.csv.ParseOptions(delimiter="\t", quote_char=False),
+        convert_options=pa.csv.ConvertOptions(
+            column_types=dict.fromkeys(names, pa.string())
+        ),
+    )
+
+
+def read_mctest(name: str, split: str) -> pd.DataFrame:
+    tsv_path, ans_path = mctest_paths(name, split)
+    # id, properties, story, then a question and its four choices, 4 times.
+    tsv = read_mctest_table(tsv_path, 23)
+    ans = read_mctest_table(ans_path, 4)
+
+    # The four question columns are stacked and taken story by story.
+    stories = tsv.num_rows
+    order = np.add.outer(np.arange(stories), np.arange(4) * stories).ravel()
+
+    def interleave(columns: list[pa.ChunkedArray]) -> pa.Array:
+        return pa.concat_arrays([c.combine_chunks() for c in columns]).take(order)
+
+    story = pc.replace_substring(tsv.column(2), "\\newline", "\n")
+    story = pc.replace_substring(story, "\\tab", "\t")
+    questions = interleave(tsv.columns[3::5])
+    prefixed = pc.match_substring_regex(questions, r"^(one|multiple):")
+    stripped = pc.utf8_trim_whitespace(
+        pc.replace_substring_regex(questions, r"^(one|multiple):", "")
+    )
+
+    # Each choice is JSON-encoded as json.dumps would, then the lists are
+    # joined column-wise.
+    pieces = []
+    for i, label in enumerate("ABCD"):
+        choices = interleave(tsv.columns[4 + i :: 5]).to_numpy(zero_copy_only=False)
+        encoded = pa.array(map(encode_basestring_ascii, choices), pa.string())
+        pieces += [f'{", " if i else "["}["{label}", ', encoded, "]"]
+    answers = pc.binary_join_element_wise(*pieces, "]", "")
+
+    return pd.DataFrame(
+        {
+            "domain": "reading_comprehension",
+            "task_id": name,
+            # Repeated as references so the four rows share one story string.
+            "text": np.repeat(story.to_numpy(zero_copy_only=False), 4),
+            "question": pc.if_else(prefixed, stripped, questions).to_numpy(
+                zero_copy_only=False
+            ),
+            "answers": answers.to_numpy(zero_copy_only=False),
+            "answer": pc.utf8_trim_whitespace(interleave(ans.columns)).to_numpy(
+                zero_copy_only=False
+            ),
+        }
+    )
+
+
+def load_mctest(config: LoadConfig) -> list[pd.DataFrame]:
+    # Arrow's CSV reader releases the GIL, so the files are read in parallel.
+    files = [(n, s) for n in config.mctest_sets for s in config.mctest_splits]
+    with ThreadPoolExecutor() as pool:
+        return list(pool.map(read_mctest, *zip(*files)))
+
+
+def iter_reading_comprehension(config: LoadConfig) -> Iterator[dict[str, Any]]:
+    for df in load_mctest(config):
+        yield from df.to_dict("records")
+
+
+def prep_reading_comprehension(config: LoadConfig) -> pd.DataFrame:
+    return pd.concat(load_mctest(config), ignore_index=True)
+
+
+def digest(*parts: str | Path) -> str:
+    h = hashlib.sha256()
+    for part in parts:
+        match part:
+            case Path():
+                with open(part, "rb") as f:
+                    h.update(hashlib.file_digest(f, "sha256").digest())
+            case str():
+                h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def legal_parts(config: LoadConfig) -> dict[str, str]:
+    return {
+        f"maud:{task_name}": digest(repr(task), task.path / "test.tsv")
+        for task_name, task in MAUD_TASKS.items()
+    }
+
+
+def legal_fingerprint(config: LoadConfig) -> str:
+    return digest(*legal_parts(config).values())
+
+
+def pubmedqa_revision() -> str:
+    # Only asked for before the snapshot exists, so runs from the snapshot
+    # never contact the hub.
+    from huggingface_hub import HfApi
+
+    try:
+        return HfApi().dataset_info(PUBMEDQA[0]).sha or ""
+    except Exception as e:
+        warn("medical.unknown_revision", f"can't look up the PubMedQA revision: {e}")
+        return ""
+
+
+def medical_fingerprint(config: LoadConfig) -> str:
+    # The loader reads the snapshot whenever it exists, so that is what is
+    # hashed; before the first fetch, the hub revision stands in for it.
+    if PUBMEDQA_SNAPSHOT.exists():
+        return digest(*PUBMEDQA, PUBMEDQA_SNAPSHOT)
+    return digest(*PUBMEDQA, pubmedqa_revision())
+
+
+def financial_fingerprint(config: LoadConfig) -> str:
+    return digest(
+        *(finqa_path(split) for split in config.finqa_splits),
+        ",".join(config.finqa_splits),
+        str(config.random_seed),
+        config.table_style,
+    )
+
+
+def financial_base_fingerprint(config: LoadConfig) -> str:
+    return digest(
+        *(finqa_path(split) for split in config.finqa_splits),
+        ",".join(config.finqa_splits),
+        config.table_style,
+    )
+
+
+def reading_comprehension_fingerprint(config: LoadConfig) -> str:
+    files = [
+        path
+        for name in config.mctest_sets
+        for split in config.mctest_splits
+        for path in mctest_paths(name, split)
+    ]
+    return digest(*files, ",".join(config.mctest_sets), ",".join(config.mctest_splits))
+
+
+def legal_task_ids(config: LoadConfig) -> tuple[str, ...]:
+    return tuple(f"maud:{task_name}" for task_name in MAUD_TASKS)
+
+
+def medical_task_ids(config: LoadConfig) -> tuple[str, ...]:
+    return ("pubmedqa",)
+
+
+def financial_task_ids(config: LoadConfig) -> tuple[str, ...]:
+    return ("finqa",)
+
+
+def reading_comprehension_task_ids(config: LoadConfig) -> tuple[str, ...]:
+    return config.mctest_sets
+
+
+@dataclass(frozen=True, kw_only=True)
+class Source:
+    load: Callable[[LoadConfig], pd.DataFrame]
+    records: Callable[[LoadConfig], Iterator[dict[str, Any]]]
+    task_ids: Callable[[LoadConfig], tuple[str, ...]]
+    # Covers every input and config field the source's frame depends on.
+    fingerprint: Callable[[LoadConfig], str]
+    # Sources split into independently loaded parts (one per MAUD task) map
+    # each part to its own fingerprint; their frames are the parts in order.
+    parts: Callable[[LoadConfig], dict[str, str]] | None = None
+    load_parts: Callable[[LoadConfig, list[str]], list[pd.DataFrame]] | None = None
+    # Rows sampled for this domain when --domain-target-size doesn't set it;
+    # None falls back to --target-size.
+    target_size: int | None = None
+    # Sources whose frame depends on the random seed can load a seed-free
+    # base frame once, cached under base_fingerprint; reseed derives each
+    # seed's frame from it (--seeds).
+    load_base: Callable[[LoadConfig], pd.DataFrame] | None = None
+    base_fingerprint: Callable[[LoadConfig], str] | None = None
+    reseed: Callable[[pd.DataFrame, int], pd.DataFrame] | None = None
+
+    def describe(self, config: LoadConfig) -> dict[str, Any]:
+        # The fingerprint and, for sources split into parts, every part's,
+        # with each input hashed once.
+        if self.parts is None:
+            return {"fingerprint": self.fingerprint(config)}
+        parts = self.parts(config)
+        return {"fingerprint": digest(*parts.values()), "parts": parts}
+
+
+# Registry order is the order domains are concatenated in before shuffling.
+SOURCES: Final[dict[str, Source]] = {
+    "reading_comprehension": Source(
+        load=prep_reading_comprehension,
+        records=iter_reading_comprehension,
+        task_ids=reading_comprehension_task_ids,
+        fingerprint=reading_comprehension_fingerprint,
+    ),
+    "medical": Source(
+        load=prep_medical,
+        records=iter_medical,
+        task_ids=medical_task_ids,
+        fingerprint=medical_fingerprint,
+    ),
+    "financial": Source(
+        load=prep_financial,
+        records=iter_financial,
+        task_ids=financial_task_ids,
+        fingerprint=financial_fingerprint,
+        load_base=prep_financial_base,
+        base_fingerprint=financial_base_fingerprint,
+        reseed=add_finqa_answers,
+    ),
+    "legal": Source(
+        load=prep_legal,
+        records=iter_legal,
+        task_ids=legal_task_ids,
+        fingerprint=legal_fingerprint,
+        parts=legal_parts,
+        load_parts=load_legal_parts,
+    ),
+}
+
+# Bump whenever a change to the prep_* functions alters the frames they return.
+CACHE_VERSION: Final[int] = 2
+
+
+@dataclass(frozen=True, kw_only=True)
+class FrameCache:
+    path: Path
+    max_bytes: int
+
+    def key(self, name: str, fingerprint: str) -> str:
+        return digest(name, str(CACHE_VERSION), fingerprint)
+
+    def get(self, name: str, key: str) -> pd.DataFrame | None:
+        path = self.path / f"{name}-{key}.parquet"
+        try:
+            df = pd.read_parquet(path)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            warn(
+                "cache.unreadable_entry", f"dropping unreadable cache entry {path}: {e}"
+            )
+            path.unlink(missing_ok=True)
+            return None
+        os.utime(path)
+        return df
+
+    def put(self, name: str, key: str, df: pd.DataFrame) -> None:
+        self.path.mkdir(parents=True, exist_ok=True)
+        path = self.path / f"{name}-{key}.parquet"
+        tmp = path.with_name(f".{path.name}.{os.getpid()}")
+        df.to_parquet(tmp)
+        tmp.replace(path)
+
+    def evict(self) -> None:
+        entries = sorted(
+            ((p, p.stat()) for p in self.path.glob("*.parquet")),
+            key=lambda entry: entry[1].st_mtime,
+            reverse=True,
+        )
+        total = 0
+        for path, stat in entries:
+            total += stat.st_size
+            if total > self.max_bytes:
+                path.unlink(missing_ok=True)
+
+
+class LoaderError(RuntimeError):
+    pass
+
+
+def run_loader(
+    name: str,
+    config: LoadConfig,
+    cache: FrameCache | None = None,
+    described: dict[str, dict[str, Any]] | None = None,
+) -> pd.DataFrame:
+    # `described` holds the domains of describe_build, so a build hashes
+    # its inputs once.
+    source = SOURCES[name]
+    entry = source.describe(config) if described is None else described[name]
+    fingerprints = entry.get("parts", {"": entry["fingerprint"]})
+    frames = dict.fromkeys(fingerprints)
+    if cache is not None:
+        for part, fingerprint in fingerprints.items():
+            frames[part] = cache.get(name, cache.key(name, fingerprint))
+
+    missing = [part for part, df in frames.items() if df is None]
+    if missing:
+        if source.load_parts is None:
+            loaded = [source.load(config)]
+        else:
+            loaded = source.load_parts(config, missing)
+        for part, df in zip(missing, loaded):
+            frames[part] = df
+            if cache is not None:
+                cache.put(name, cache.key(name, fingerprints[part]), df)
+
+    if len(frames) == 1:
+        return next(iter(frames.values()))
+    return pd.concat(frames.values(), axis=0, ignore_index=True)
+
+
+def run_base_loader(
+    name: str,
+    config: LoadConfig,
+    cache: FrameCache | None = None,
+    described: dict[str, dict[str, Any]] | None = None,
+) -> pd.DataFrame:
+    source = SOURCES[name]
+    if source.load_base is None:
+        return run_loader(name, config, cache, described)
+
+    # The base frame is cached under its own, seed-free fingerprint.
+    entry = f"{name}-base"
+    key = ""
+    if cache is not None:
+        key = cache.key(entry, source.base_fingerprint(config))
+        df = cache.get(entry, key)
+        if df is not None:
+            return df
+    df = source.load_base(config)
+    if cache is not None:
+        cache.put(entry, key, df)
+    return df
+
+
+def split_quota(total: int, keys: Iterable[str]) -> dict[str, int]:
+    keys = list(keys)
+    base, remainder = divmod(total, len(keys))
+    return {key: base + (i < remainder) for i, key in enumerate(keys)}
+
+
+def reservoir_sample(
+    records: Iterable[dict[str, Any]], quotas: dict[str, int], rng: random.Random
+) -> list[dict[str, Any]]:
+    reservoirs: dict[str, list[dict[str, Any]]] = {key: [] for key in quotas}
+    seen = dict.fromkeys(quotas, 0)
+    for record in records:
+        task_id = record["task_id"]
+        reservoir = reservoirs[task_id]
+        seen[task_id] += 1
+        if len(reservoir) < quotas[task_id]:
+            reservoir.append(record)
+        else:
+            j = rng.randrange(seen[task_id])
+            if j < quotas[task_id]:
+                reservoir[j] = record
+
+    return [record for reservoir in reservoirs.values() for record in reservoir]
+
+
+SHORTFALL_POLICIES: Final[tuple[str, ...]] = ("error", "truncate", "redistribute")
+
+
+def apportion(total: int, weights: np.ndarray) -> np.ndarray:
+    # Largest remainder; ties go to the earlier stratum, as in split_quota.
+    quotas = np.zeros(len(weights), dtype=np.int64)
+    if total <= 0 or not weights.sum():
+        return quotas
+    exact = total * weights / weights.sum()
+    quotas += np.floor(exact).astype(np.int64)
+    order = np.argsort(quotas - exact, kind="stable")
+    quotas[order[: total - quotas.sum()]] += 1
+    return quotas
+
+
+def cap_quotas(
+    quotas: np.ndarray,
+    capacity: np.ndarray,
+    weights: np.ndarray,
+    shortfall: str,
+    labels: pd.Index,
+    column: str,
+) -> np.ndarray:
+    short = quotas > capacity
+    if not short.any():
+        return quotas
+    if shortfall == "error":
+        label, wanted, available = next(
+            zip(labels[short], quotas[short], capacity[short])
+        )
+        raise ValueError(
+            f"{column}={label!r} has {available} rows, {wanted} were requested"
+        )
+    if shortfall == "redistribute":
+        # Short strata give their deficit to the others, by weight, until it
+        # fits or no stratum has rows left.
+        total = quotas.sum()
+        while short.any():
+            quotas = np.minimum(quotas, capacity)
+            room = np.where(quotas < capacity, weights, 0.0)
+            quotas += apportion(total - quotas.sum(), room)
+            short = quotas > capacity
+    return np.minimum(quotas, capacity)
+
+
+def stratum_quotas(
+    sizes: pd.Series,
+    size: int | Mapping[Any, int],
+    proportions: Mapping[str, Mapping[Any, float]],
+    shortfall: str,
+) -> np.ndarray:
+    # Quotas are split level by level: the total across the values of the
+    # first column, then each of those across the values of the next one.
+    levels = [sizes.index.get_level_values(i) for i in range(sizes.index.nlevels)]
+    names = sizes.index.names
+    counts = sizes.to_numpy()
+    quotas = np.zeros(len(sizes), dtype=np.int64)
+
+    def fill(strata: np.ndarray, depth: int, total: int) -> None:
+        codes, labels = pd.factorize(levels[depth][strata])
+        capacity = np.bincount(codes, counts[strata], len(labels)).astype(np.int64)
+        weights = proportions.get(names[depth])
+        if weights is None:
+            weights = np.ones(len(labels))
+        else:
+            weights = np.array([weights.get(label, 0.0) for label in labels])
+
+        if depth == 0 and isinstance(size, Mapping):
+            wanted = np.array([size.get(label, 0) for label in labels], np.int64)
+            policy = "error" if shortfall == "error" else "truncate"
+        else:
+            wanted, policy = apportion(total, weights), shortfall
+        wanted = cap_quotas(wanted, capacity, weights, policy, labels, names[depth])
+
+        for code, n in enumerate(wanted):
+            children = strata[codes == code]
+            if depth + 1 == len(levels):
+                quotas[children] = n
+            else:
+                fill(children, depth + 1, n)
+
+    fill(np.arange(len(sizes)), 0, 0 if isinstance(size, Mapping) else size)
+    return quotas
+
+
+def stratified_sample(
+    df: pd.DataFrame,
+    by: Sequence[str],
+    size: int | Mapping[Any, int],
+    random_seed: int,
+    proportions: Mapping[str, Mapping[Any, float]] | None = None,
+    shortfall: str = "redistribute",
+) -> pd.DataFrame:
+    groups = df.groupby(list(by), sort=False, dropna=False, observed=True)
+    codes = groups.ngroup().to_numpy()
+    quotas = stratum_quotas(groups.size(), size, proportions or {}, shortfall)
+
+    # One shuffle and one grouped rank: the first quotas[stratum] shuffled
+    # rows of every stratum are kept, in stratum order.
+    rng = np.random.default_rng(random_seed)
+    shuffled = rng.permutation(len(df))
+    stratum = codes[shuffled]
+    rank = pd.Series(stratum).groupby(stratum, sort=False).cumcount().to_numpy()
+    picked = shuffled[rank < quotas[stratum]]
+    picked = picked[np.argsort(codes[picked], kind="stable")]
+    return df.iloc[picked].reset_index(drop=True)
+
+
+def sample_stream(
+    name: str, config: LoadConfig, target_size: int | Mapping[str, int]
+) -> pd.DataFrame:
+    source = SOURCES[name]
+    if isinstance(target_size, Mapping):
+        target_size = target_size[name]
+    rng = random.Random(f"{config.random_seed}:{name}")
+    return pd.DataFrame(
+        reservoir_sample(
+            source.records(config),
+            split_quota(target_size, source.task_ids(config)),
+            rng,
+        )
+    )
+
+
+def measure_source(
+    name: str,
+    config: LoadConfig,
+    stage: str,
+    fn: Callable[..., pd.DataFrame],
+    profile_dir: Path | None,
+    *args: Any,
+) -> tuple[pd.DataFrame, dict[str, Any], Counter[str]]:
+    return measure(f"{stage}:{name}", profile_dir, fn, name, config, *args)
+
+
+def map_sources(
+    fn: Callable[..., Any],
+    config: LoadConfig,
+    jobs: int,
+    *args: Any,
+    names: Sequence[str] | None = None,
+) -> dict[str, Any]:
+    # Only the named sources are touched: the others are never read, fetched
+    # or fingerprinted.
+    names = list(SOURCES) if names is None else names
+    if jobs <= 1:
+        results = {}
+        for name in names:
+            try:
+                results[name] = fn(name, config, *args)
+            except Exception as e:
+                raise LoaderError(f"{name} loader failed: {e}") from e
+        return results
+
+    pool = ProcessPoolExecutor(max_workers=min(jobs, len(names)))
+    futures = {pool.submit(fn, name, config, *args): name for name in names}
+    try:
+        for future in as_completed(futures):
+            try:
+                future.result()
+            except Exception as e:
+                raise LoaderError(f"{futures[future]} loader failed: {e}") from e
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    return {name: future.result() for future, name in futures.items()}
+
+
+# While the dataset is assembled, these columns are held as categoricals in
+# frames where they repeat and as Arrow strings elsewhere, and the passage
+# text as Arrow strings; writers get plain strings.
+CATEGORY_COLUMNS: Final[tuple[str, ...]] = (
+    "domain",
+    "task_id",
+    "question",
+    "answers",
+    "answer",
+)
+
+TEXT_DTYPE: Final = pd.StringDtype("pyarrow")
+
+
+def compact(df: pd.DataFrame) -> pd.DataFrame:
+    # A categorical only pays off when values repeat: PubMedQA's questions
+    # or FinQA's answers are unique per row and smaller as Arrow strings.
+    dtypes: dict[str, Any] = {
+        name: "category" if df[name].nunique() < len(df) // 2 else TEXT_DTYPE
+        for name in CATEGORY_COLUMNS
+        if name in df
+    }
+    if "text" in df:
+        dtypes["text"] = TEXT_DTYPE
+    return df.astype(dtypes)
+
+
+def compact_sources(sources: dict[str, pd.DataFrame]) -> dict[str, pd.DataFrame]:
+    return {name: compact(df) for name, df in sources.items()}
+
+
+def expand(df: pd.DataFrame) -> pd.DataFrame:
+    return df.astype(
+        {
+            name: object
+            for name, dtype in df.dtypes.items()
+            if isinstance(dtype, (pd.CategoricalDtype, pd.StringDtype))
         }
     )
 
 
-def prep_financial() -> pd.DataFrame:
-    with open("./FinQA/dataset/test.json", "r", encoding="utf-8") as f:
-        data = json.load(f)
+def frame_bytes(frames: Iterable[pd.DataFrame]) -> int:
+    return int(sum(df.memory_usage(index=False, deep=True).sum() for df in frames))
+
+
+def concat_compact(frames: list[pd.DataFrame]) -> pd.DataFrame:
+    # pd.concat falls back to object columns unless the categories match;
+    # recompacting the (sampled) rows is cheaper than unioning the
+    # categories of the whole pool.
+    return compact(pd.concat(frames, ignore_index=True))
+
+
+OUTPUT_FORMATS: Final[tuple[str, ...]] = ("csv", "parquet", "arrow", "jsonl")
+
+DICTIONARY_COLUMNS: Final[tuple[str, ...]] = ("domain", "task_id", "question")
+
+
+def decode_answers(answers: pd.Series) -> tuple[np.ndarray, list[list[list[str]]]]:
+    codes, uniques = pd.factorize(answers)
+    return codes, [json.loads(a) for a in uniques]
+
+
+def to_arrow_table(df: pd.DataFrame) -> pa.Table:
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    for name in DICTIONARY_COLUMNS:
+        if name in df:
+            table = table.set_column(
+                table.schema.get_field_index(name),
+                name,
+                table[name].dictionary_encode(),
+            )
+
+    if "answers" not in df:
+        return table
+
+    codes, choices = decode_answers(df["answers"])
+    answers = pa.array(
+        [[{"label": label, "text": text} for label, text in c] for c in choices],
+        type=ANSWERS_TYPE,
+    ).take(pa.array(codes))
+    return table.set_column(table.schema.get_field_index("answers"), "answers", answers)
+
+
+def write_jsonl(df: pd.DataFrame, path: str | Path) -> None:
+    if "answers" in df:
+        codes, choices = decode_answers(df["answers"])
+    else:
+        codes, choices = np.full(len(df), -1), []
+
+    columns = list(df.columns)
+    with open(path, "w", encoding="utf-8") as f:
+        for code, row in zip(codes, df.itertuples(index=False, name=None)):
+            record = dict(zip(columns, row))
+            if code >= 0:
+                record["answers"] = choices[code]
+            f.write(json.dumps(record, ensure_ascii=False))
+            f.write("\n")
+
+
+def write_output(df: pd.DataFrame, path: str | Path, fmt: str) -> None:
+    df = expand(df)
+    match fmt:
+        case "csv":
+            df.to_csv(path, index=False)
+        case "parquet":
+            pq.write_table(to_arrow_table(df), path)
+        case "arrow":
+            table = to_arrow_table(df)
+            with pa.ipc.new_file(path, table.schema) as writer:
+                writer.write_table(table)
+        case "jsonl":
+            write_jsonl(df, path)
+        case _:
+            raise ValueError(f"Unknown output format: {fmt}")
+
+
+def passage_id(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+def normalize(df: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame]:
+    codes, texts = pd.factorize(df["text"].fillna(""))
+    ids = np.array([passage_id(text) for text in texts], dtype=object)
+
+    passages = pd.DataFrame({"passage_id": ids, "text": texts})
+    questions = df.drop(columns="text")
+    questions.insert(df.columns.get_loc("text"), "passage_id", ids[codes])
+    return questions, passages
+
+
+def write_dataset(
+    df: pd.DataFrame, path: str | Path, fmt: str, layout: str
+) -> list[Path]:
+    match layout:
+        case "flat":
+            write_output(df, path, fmt)
+            return [Path(path)]
+        case "normalized":
+            questions, passages = normalize(df)
+            questions_path, passages_path = normalized_paths(path)
+            write_output(questions, questions_path, fmt)
+            write_output(passages, passages_path, fmt)
+            return [questions_path, passages_path]
+        case _:
+            raise ValueError(f"Unknown output layout: {layout}")
+
+
+def assign_shards(df: pd.DataFrame, shards: int) -> np.ndarray:
+    # Each domain is sorted by text length and dealt out serpentine (0..N-1,
+    # N-1..0, ...), so every shard gets a similar count and length mix.
+    domains, _ = pd.factorize(df["domain"], sort=True)
+    lengths = df["text_chars"].to_numpy()
+    order = np.lexsort((lengths, domains))
+
+    assignment = np.empty(len(df), dtype=np.int64)
+    counts = np.zeros(shards, dtype=np.int64)
+    for rows in np.split(order, np.flatnonzero(np.diff(domains[order])) + 1):
+        block, position = np.divmod(np.arange(len(rows)), shards)
+        slots = np.where(block % 2, shards - 1 - position, position)
+        # The slots that got an extra row go to the smallest shards so far.
+        shard_of_slot = np.empty(shards, dtype=np.int64)
+        shard_of_slot[
+            np.argsort(-np.bincount(slots, minlength=shards), kind="stable")
+        ] = np.argsort(counts, kind="stable")
+        assignment[rows] = shard_of_slot[slots]
+        counts += np.bincount(assignment[rows], minlength=shards)
+    return assignment
+
+
+def file_entry(path: Path) -> dict[str, Any]:
+    with open(path, "rb") as f:
+        sha256 = hashlib.file_digest(f, "sha256").hexdigest()
+    return {"path": path.name, "bytes": path.stat().st_size, "sha256": sha256}
+
+
+def domain_counts(df: pd.DataFrame) -> dict[str, int]:
+    return {domain: int(n) for domain, n in df["domain"].value_counts().items() if n}
+
+
+def write_shards(
+    df: pd.DataFrame, path: str | Path, fmt: str, layout: str, shards: int
+) -> list[Path]:
+    assignment = assign_shards(df, shards)
+    entries = []
+    written = []
+    for index in range(shards):
+        shard = df[assignment == index].reset_index(drop=True)
+        files = write_dataset(shard, shard_path(path, index, shards), fmt, layout)
+        written.extend(files)
+        entries.append(
+            {
+                "index": index,
+                "rows": len(shard),
+                "domains": dict(sorted(domain_counts(shard).items())),
+                "text_chars": int(shard["text_chars"].sum()),
+                "files": [file_entry(f) for f in files],
+            }
+        )
+
+    manifest = {
+        "format": fmt,
+        "layout": layout,
+        "rows": len(df),
+        "domains": dict(sorted(domain_counts(df).items())),
+        "shards": entries,
+    }
+    with open(manifest_path(path), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+        f.write("\n")
+    return [*written, manifest_path(path)]
+
+
+def build_manifest_path(path: str | Path) -> Path:
+    path = Path(path)
+    return path.with_name(f"{path.name}.build.json")
+
 
-    processed_records = []
-    for record in data:
-        processed_record = process_finqa_record(record)
-        if processed_record is not None:
-            processed_records.append(processed_record)
+def describe_build(
+    config: LoadConfig, options: dict[str, Any], names: Sequence[str]
+) -> dict[str, Any]:
+    # Inputs are hashed here before any loader runs, so an unreadable one
+    # fails as its domain's loader would.
+    domains = {}
+    for name in names:
+        try:
+            domains[name] = SOURCES[name].describe(config)
+        except Exception as e:
+            raise LoaderError(f"{name} loader failed: {e}") from e
+    return {"cache_version": CACHE_VERSION, "options": options, "domains": domains}
 
-    return pd.DataFrame(processed_records)
 
+def batch_manifest_path(path: str | Path) -> Path:
+    path = Path(path)
+    return path.with_name(f"{path.name}.batch.json")
 
-def prep_reading_comprehension() -> pd.DataFrame:
-    with open("./mctest/data/MCTest/mc500.test.tsv", "r", encoding="utf-8") as f:
-        tsv_lines = f.read().strip().split("\n")
-    with open("./mctest/data/MCTestAnswers/mc500.test.ans", "r", encoding="utf-8") as f:
-        ans_lines = f.read().strip().split("\n")
 
-        all_rows = []
+def dedup_report_path(path: str | Path) -> Path:
+    path = Path(path)
+    return path.with_name(f"{path.name}.dedup.json")
 
-    for tsv_line, ans_line in zip(tsv_lines, ans_lines):
-        tsv_parts = tsv_line.split("\t")
 
-        story = tsv_parts[2].replace("\\newline", "\n").replace("\\tab", "\t")
+def write_dedup_report(args: Namespace, clusters: list[dict[str, Any]]) -> Path:
+    report = {
+        "policy": args.dedup,
+        "text_threshold": args.dedup_text_threshold,
+        "question_threshold": args.dedup_question_threshold,
+        "rows_in_clusters": sum(cluster["size"] for cluster in clusters),
+        "dropped": sum(
+            not row["kept"] for cluster in clusters for row in cluster["rows"]
+        ),
+        "cross_domain_clusters": sum(len(c["domains"]) > 1 for c in clusters),
+        "clusters": clusters,
+    }
+    path = dedup_report_path(args.output)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+        f.write("\n")
+    return path
 
-        questions_data = []
-        for q_idx in range(4):
-            start_idx = 3 + (q_idx * 5)
-            if start_idx + 4 < len(tsv_parts):
-                question_text = tsv_parts[start_idx]
 
-                clean_question = question_text
-                if question_text.startswith("one:"):
-                    clean_question = question_text[4:].strip()
-                elif question_text.startswith("multiple:"):
-                    clean_question = question_text[9:].strip()
+def read_build_manifest(path: str | Path) -> dict[str, Any] | None:
+    try:
+        with open(build_manifest_path(path), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        warn("build.unreadable_manifest", f"ignoring unreadable build manifest: {e}")
+        return None
 
-                answer_a = tsv_parts[start_idx + 1]
-                answer_b = tsv_parts[start_idx + 2]
-                answer_c = tsv_parts[start_idx + 3]
-                answer_d = tsv_parts[start_idx + 4]
 
-                questions_data.append(
-                    {
-                        "question": clean_question,
-                        "choices": [
-                            ("A", answer_a),
-                            ("B", answer_b),
-                            ("C", answer_c),
-                            ("D", answer_d),
-                        ],
-                    }
-                )
+def outputs_intact(path: str | Path, outputs: list[dict[str, Any]]) -> bool:
+    directory = Path(path).parent
+    return all(
+        (directory / entry["path"]).exists()
+        and file_entry(directory / entry["path"]) == entry
+        for entry in outputs
+    )
 
-        correct_answers = ans_line.split("\t")
 
-        for q_idx, question_data in enumerate(questions_data):
-            if q_idx < len(correct_answers):
-                correct_answer = correct_answers[q_idx].strip()
+def report_changes(previous: dict[str, Any], build: dict[str, Any]) -> None:
+    if previous["cache_version"] != build["cache_version"]:
+        print("cache version changed, rebuilding every domain")
+    for option, value in build["options"].items():
+        if previous["options"].get(option) != value:
+            print(f"{option} changed: {previous['options'].get(option)} -> {value}")
+
+    for name, domain in build["domains"].items():
+        before = previous["domains"].get(name, {})
+        if before.get("fingerprint") == domain["fingerprint"]:
+            continue
+        if "parts" not in domain or "parts" not in before:
+            print(f"{name}: inputs changed, rebuilding")
+            continue
+        changed = [
+            part
+            for part, fingerprint in domain["parts"].items()
+            if before["parts"].get(part) != fingerprint
+        ]
+        removed = before["parts"].keys() - domain["parts"].keys()
+        print(
+            f"{name}: rebuilding {len(changed)} of {len(domain['parts'])} parts"
+            + (f" ({', '.join(changed)})" if changed else "")
+            + (f", dropped {', '.join(sorted(removed))}" if removed else "")
+        )
 
-                row = {
-                    "domain": "reading_comprehension",
-                    "task_id": "mc500",
-                    "text": story,
-                    "question": question_data["question"],
-                    "answers": json.dumps(question_data["choices"]),
-                    "answer": correct_answer,
-                }
-                all_rows.append(row)
 
-    return pd.DataFrame(all_rows)
+def domain_target_size(value: str) -> tuple[str, int]:
+    name, sep, size = value.partition("=")
+    if not sep or name not in SOURCES or not size.isdigit():
+        raise ArgumentTypeError(
+            f"expected DOMAIN=ROWS with DOMAIN one of {', '.join(SOURCES)}"
+        )
+    return name, int(size)
+
+
+def seed_list(value: str) -> list[int]:
+    # "1-50", "7" or "1,4,10-12"
+    seeds = []
+    try:
+        for part in value.split(","):
+            first, _, last = part.partition("-")
+            seeds.extend(range(int(first), int(last or first) + 1))
+    except ValueError:
+        raise ArgumentTypeError(f"expected seeds like 1-50 or 1,4,10-12: {value!r}")
+    return list(dict.fromkeys(seeds))
+
+
+def size_list(value: str) -> list[int]:
+    try:
+        return [int(size) for size in value.split(",")]
+    except ValueError:
+        raise ArgumentTypeError(f"expected sizes like 300,600: {value!r}")
 
 
 def parse_args():
     parser = ArgumentParser()
     parser.add_argument("--output")
-    parser.add_argument("--target-size", default=600)
-    parser.add_argument("--random-seed", default=42)
-    return parser.parse_args()
-
+    parser.add_argument("--target-size", type=int, default=600)
+    parser.add_argument("--seeds", type=seed_list)
+    parser.add_argument("--target-sizes", type=size_list, dest="batch_target_sizes")
+    parser.add_argument("--domains", nargs="+", choices=SOURCES, default=list(SOURCES))
+    parser.add_argument(
+        "--domain-target-size",
+        type=domain_target_size,
+        action="append",
+        default=[],
+        metavar="DOMAIN=ROWS",
+    )
+    parser.add_argument("--random-seed", type=int, default=42)
+    parser.add_argument("--format", choices=OUTPUT_FORMATS, default="csv")
+    parser.add_argument("--layout", choices=("flat", "normalized"), default="flat")
+    parser.add_argument("--shards", type=int)
+    parser.add_argument("--bm25-index", action="store_true")
+    parser.add_argument("--chunk-index", choices=CHUNK_MODES, default="off")
+    parser.add_argument("--chunk-size", type=int, default=2048, help="characters")
+    parser.add_argument("--jobs", type=int, default=1)
+    parser.add_argument("--cache-dir", type=Path, default=Path("./.cache"))
+    parser.add_argument("--cache-max-size", type=int, default=1024, help="MiB")
+    parser.add_argument("--no-cache", action="store_true")
+    parser.add_argument("--verify-incremental", action="store_true")
+    parser.add_argument("--metrics", type=Path)
+    parser.add_argument("--profile", type=Path)
+    parser.add_argument("--streaming", action="store_true")
+    parser.add_argument("--dedup", choices=DEDUP_POLICIES, default="off")
+    parser.add_argument("--dedup-text-threshold", type=float, default=0.8)
+    parser.add_argument("--dedup-question-threshold", type=float, default=0.8)
+    parser.add_argument("--permutations", type=int)
+    parser.add_argument("--order", choices=ORDERS, default="random")
+    parser.add_argument("--bucket-size", type=int, default=64)
+    parser.add_argument("--table-style", choices=TABLE_STYLES, default="pipe")
+    parser.add_argument(
+        "--strata", nargs="+", choices=("task_id", "answer"), default=["task_id"]
+    )
+    parser.add_argument(
+        "--shortfall", choices=SHORTFALL_POLICIES, default="redistribute"
+    )
+    parser.add_argument(
+        "--finqa-splits", nargs="+", choices=FINQA_SPLITS, default=["test"]
+    )
+    parser.add_argument(
+        "--mctest-sets", nargs="+", choices=MCTEST_SETS, default=["mc500"]
+    )
+    parser.add_argument(
+        "--mctest-splits", nargs="+", choices=MCTEST_SPLITS, default=["test"]
+    )
+    args = parser.parse_args()
+    if args.streaming and args.dedup != "off":
+        parser.error("--dedup needs the loaded sources and can't use --streaming")
+    if args.chunk_size < 1:
+        parser.error("--chunk-size must be at least 1")
+    if args.permutations is not None and args.permutations < 1:
+        parser.error("--permutations must be at least 1")
+    if args.bucket_size < 1:
+        parser.error("--bucket-size must be at least 1")
+    if args.shards is not None and args.shards < 1:
+        parser.error("--shards must be at least 1")
+    if args.seeds or args.batch_target_sizes:
+        if args.streaming or args.verify_incremental:
+            parser.error(
+                "--seeds and --target-sizes can't be combined with --streaming "
+                "or --verify-incremental"
+            )
+    return args
+
+
+def balance(
+    sources: dict[str, pd.DataFrame],
+    target_size: int | Mapping[str, int],
+    random_seed: int,
+    strata: Sequence[str] = ("task_id",),
+    shortfall: str = "redistribute",
+) -> dict[str, pd.DataFrame]:
+    balanced = {}
+    for name, df in sources.items():
+        size = target_size[name] if isinstance(target_size, Mapping) else target_size
+        try:
+            balanced[name] = stratified_sample(
+                df, strata, size, random_seed, shortfall=shortfall
+            )
+        except ValueError as e:
+            raise ValueError(f"cannot sample {name}: {e}") from e
+    return balanced
 
-def main():
-    args = parse_args()
 
-    target_size = args.target_size
-    random_seed = args.random_seed
+def shuffle(balanced: dict[str, pd.DataFrame], random_seed: int) -> pd.DataFrame:
+    cross_domain_dataset = concat_compact(
+        [balanced[name] for name in SOURCES if name in balanced]
+    )
+    return cross_domain_dataset.sample(frac=1, random_state=random_seed).reset_index(
+        drop=True
+    )
 
-    random.seed(random_seed)
 
-    legal = prep_legal()
-    medical = prep_medical()
-    financial = prep_financial()
-    rc = prep_reading_comprehension()
+ORDERS: Final[tuple[str, ...]] = ("random", "length-bucketed")
 
-    balanced_dfs = []
+# Lengths of the prompt an evaluation harness would build from a row: the
+# passage, then the question, then one "A. option" line per choice.
+PROMPT_SEPARATORS: Final[tuple[str, ...]] = ("\n\n", "\n")
 
-    rc_balanced = rc.sample(n=target_size, replace=False, random_state=random_seed)
-    balanced_dfs.append(rc_balanced)
 
-    medical_balanced = medical.sample(
-        n=target_size, replace=False, random_state=random_seed
+def string_lengths(strings: pa.Array) -> np.ndarray:
+    # Characters, UTF-8 bytes and whitespace-separated tokens per string.
+    return np.stack(
+        [
+            length.fill_null(0).to_numpy().astype(np.int64)
+            for length in (
+                pc.utf8_length(strings),
+                pc.binary_length(strings),
+                pc.count_substring_regex(strings, r"\S+"),
+            )
+        ]
     )
-    balanced_dfs.append(medical_balanced)
 
-    financial_balanced = financial.sample(
-        n=target_size, replace=False, random_state=random_seed
+
+def category_lengths(
+    column: pd.Series, render: Callable[[str], str] = str
+) -> np.ndarray:
+    # Measured once per distinct value and gathered by code; missing values
+    # (code -1) pick up the zero column padded on at the end.
+    codes, uniques = pd.factorize(column)
+    strings = pa.array([render(value) for value in uniques], pa.string())
+    lengths = np.pad(string_lengths(strings), ((0, 0), (0, 1)))
+    return lengths[:, codes]
+
+
+def render_choices(answers: str) -> str:
+    return "\n".join(f"{label}. {text}" for label, text in json.loads(answers))
+
+
+def add_lengths(df: pd.DataFrame) -> pd.DataFrame:
+    text = string_lengths(pa.array(df["text"], pa.large_string()))
+    prompt = (
+        text
+        + category_lengths(df["question"])
+        + category_lengths(df["answers"], render_choices)
+    )
+    prompt[0] += sum(len(sep) for sep in PROMPT_SEPARATORS)
+    prompt[1] += sum(len(sep.encode("utf-8")) for sep in PROMPT_SEPARATORS)
+
+    df = df.copy()
+    for prefix, lengths in (("text", text), ("prompt", prompt)):
+        for unit, values in zip(("chars", "bytes", "tokens"), lengths):
+            df[f"{prefix}_{unit}"] = values
+    return df
+
+
+def order_by_length(
+    df: pd.DataFrame, random_seed: int, bucket_size: int
+) -> pd.DataFrame:
+    # Rows are sorted by prompt tokens and cut into buckets of bucket_size;
+    # the buckets are then shuffled, so batches taken in order are dense
+    # without running from the shortest rows to the longest.
+    order = np.argsort(df["prompt_tokens"].to_numpy(), kind="stable")
+    buckets = np.split(order, np.arange(bucket_size, len(order), bucket_size))
+    rng = np.random.default_rng(random_seed)
+    rows = np.concatenate([buckets[i] for i in rng.permutation(len(buckets))])
+    return df.iloc[rows].reset_index(drop=True)
+
+
+def distinct_draws(rng: np.random.Generator, m: int, k: int, n: int) -> np.ndarray:
+    # n rows of k distinct integers in [0, m), by Floyd's sampling run on
+    # all rows at once.
+    drawn = np.empty((n, k), dtype=np.int64)
+    for i, j in enumerate(range(m - k, m)):
+        t = rng.integers(0, j + 1, n)
+        seen = (drawn[:, :i] == t[:, None]).any(axis=1)
+        drawn[:, i] = np.where(seen, j, t)
+    return rng.permuted(drawn, axis=1)
+
+
+def unrank_permutations(ranks: np.ndarray, size: int) -> np.ndarray:
+    # The permutations of range(size) at the given lexicographic ranks, read
+    # off their factorial-base digits.
+    remaining = np.tile(np.arange(size), (len(ranks), 1))
+    orders = np.empty((len(ranks), size), dtype=np.int64)
+    for position in range(size):
+        digits, ranks = np.divmod(ranks, math.factorial(size - 1 - position))
+        orders[:, position] = remaining[np.arange(len(ranks)), digits]
+        keep = np.arange(size - position) != digits[:, None]
+        remaining = remaining[keep].reshape(len(ranks), -1)
+    return orders
+
+
+def permute_answers(
+    df: pd.DataFrame, permutations: int, random_seed: int
+) -> pd.DataFrame:
+    # K copies of every row; copy 0 keeps the original order and the others
+    # get distinct seeded random orders. Rows with the same number of choices
+    # are permuted as one block of arrays, and each distinct answers value is
+    # decoded once.
+    codes, uniques = pd.factorize(df["answers"])
+    choices = [json.loads(a) for a in uniques]
+    letters = np.array([chr(ord("A") + i) for i in range(max(map(len, choices)))])
+    for c in choices:
+        if [label for label, _ in c] != list(letters[: len(c)]):
+            raise ValueError(f"choices are not labelled A, B, C, ...: {c}")
+    counts = np.array([len(c) for c in choices])
+    answer = df["answer"].astype(str).to_numpy()
+    original = np.searchsorted(letters, answer)
+    invalid = (original >= counts[codes]) | (
+        letters[np.minimum(original, len(letters) - 1)] != answer
     )
-    balanced_dfs.append(financial_balanced)
+    if invalid.any():
+        raise ValueError(f"answer {answer[invalid][0]!r} is not one of the choices")
+
+    n = len(df)
+    rows = np.repeat(np.arange(n), permutations)
+    copy = np.tile(np.arange(permutations), n)
+    answers = np.empty(n * permutations, dtype=object)
+    remapped = np.empty(n * permutations, dtype=object)
+    rng = np.random.default_rng(random_seed)
+    for size in np.unique(counts):
+        block = np.flatnonzero(counts[codes[rows]] == size)
+        # JSON-encoded choice texts of every distinct answers value, so the
+        # permuted lists are assembled by string concatenation.
+        texts = np.array(
+            [
+                [json.dumps(text) for _, text in c] if len(c) == size else [""] * size
+                for c in choices
+            ],
+            dtype=object,
+        )[codes[rows[block]]]
+        # Copies 1 to K-1 of an example draw ranks of orders other than the
+        # original (rank 0) without replacement; once all size! - 1 are used
+        # they repeat in the same cycle.
+        others = math.factorial(size) - 1
+        draws = distinct_draws(
+            rng, others, min(permutations - 1, others), len(block) // permutations
+        )
+        ranks = np.zeros((len(draws), permutations), dtype=np.int64)
+        if others:
+            ranks[:, 1:] = 1 + draws[:, np.arange(permutations - 1) % others]
+        order = unrank_permutations(ranks.ravel(), size)
+        texts = np.take_along_axis(texts, order, axis=1)
+
+        encoded = np.full(len(block), "[", dtype=object)
+        for j in range(size):
+            separator = ", " if j else ""
+            encoded += f'{separator}["{letters[j]}", ' + texts[:, j] + "]"
+        answers[block] = encoded + "]"
+        remapped[block] = letters[
+            np.argmax(order == original[rows[block], None], axis=1)
+        ]
+
+    expanded = df.iloc[rows].reset_index(drop=True)
+    expanded["answers"] = answers
+    expanded["answer"] = remapped
+    expanded["example_id"] = rows
+    expanded["permutation_id"] = copy
+    return compact(expanded)
+
+
+def load_sources(
+    args: Namespace,
+    config: LoadConfig,
+    cache: FrameCache | None,
+    metrics: RunMetrics,
+    loader: Callable[..., pd.DataFrame] = run_loader,
+    described: dict[str, dict[str, Any]] | None = None,
+) -> tuple[dict[str, pd.DataFrame], list[dict[str, Any]] | None]:
+    if args.streaming:
+        stage, fn, fn_args = "stream", sample_stream, (args.target_sizes,)
+    else:
+        stage, fn, fn_args = "load", loader, (cache, described)
+    measured = map_sources(
+        measure_source,
+        config,
+        args.jobs,
+        stage,
+        fn,
+        metrics.profile_dir,
+        *fn_args,
+        names=args.domains,
+    )
+    sources = {
+        name: metrics.add(f"{stage}:{name}", result)
+        for name, result in measured.items()
+    }
+    bytes_in = frame_bytes(sources.values())
+    sources = metrics.run("compact", compact_sources, sources)
+    metrics.stages["compact"]["bytes_in"] = bytes_in
+    metrics.stages["compact"]["bytes_out"] = frame_bytes(sources.values())
+
+    clusters = None
+    if args.dedup != "off":
+        rows_in = sum(map(len, sources.values()))
+        sources, clusters = metrics.run(
+            "dedup",
+            deduplicate,
+            sources,
+            DedupConfig(
+                text_threshold=args.dedup_text_threshold,
+                question_threshold=args.dedup_question_threshold,
+            ),
+            args.dedup,
+        )
+        metrics.stages["dedup"]["rows_in"] = rows_in
+        metrics.stages["dedup"]["rows_out"] = sum(map(len, sources.values()))
+        metrics.stages["dedup"]["clusters"] = len(clusters)
+
+    if cache is not None:
+        cache.evict()
+    return sources, clusters
+
+
+def assemble(
+    args: Namespace, sources: dict[str, pd.DataFrame], metrics: RunMetrics
+) -> pd.DataFrame:
+    if args.streaming:
+        balanced = sources
+    else:
+        balanced = metrics.run(
+            "sampling",
+            balance,
+            sources,
+            args.target_sizes,
+            args.random_seed,
+            args.strata,
+            args.shortfall,
+        )
+        metrics.stages["sampling"]["rows_in"] = sum(map(len, sources.values()))
+        metrics.stages["sampling"]["rows_out"] = sum(map(len, balanced.values()))
+
+    cross_domain_dataset = metrics.run("shuffle", shuffle, balanced, args.random_seed)
+    if args.permutations:
+        cross_domain_dataset = metrics.run(
+            "permutations",
+            permute_answers,
+            cross_domain_dataset,
+            args.permutations,
+            args.random_seed,
+        )
+    cross_domain_dataset = metrics.run("lengths", add_lengths, cross_domain_dataset)
+    if args.order == "length-bucketed":
+        cross_domain_dataset = metrics.run(
+            "order",
+            order_by_length,
+            cross_domain_dataset,
+            args.random_seed,
+            args.bucket_size,
+        )
+    return cross_domain_dataset
+
+
+def build_dataset(
+    args: Namespace,
+    config: LoadConfig,
+    cache: FrameCache | None,
+    metrics: RunMetrics,
+    described: dict[str, dict[str, Any]] | None = None,
+) -> tuple[pd.DataFrame, list[dict[str, Any]] | None]:
+    sources, clusters = load_sources(args, config, cache, metrics, described=described)
+    return assemble(args, sources, metrics), clusters
+
+
+def write_outputs(
+    args: Namespace, cross_domain_dataset: pd.DataFrame, metrics: RunMetrics
+) -> list[Path]:
+    if args.shards:
+        outputs = metrics.run(
+            "write",
+            write_shards,
+            cross_domain_dataset,
+            args.output,
+            args.format,
+            args.layout,
+            args.shards,
+        )
+    else:
+        outputs = metrics.run(
+            "write",
+            write_dataset,
+            cross_domain_dataset,
+            args.output,
+            args.format,
+            args.layout,
+        )
+    metrics.stages["write"]["rows_in"] = len(cross_domain_dataset)
+    metrics.stages["write"]["bytes"] = sum(path.stat().st_size for path in outputs)
+
+    if args.bm25_index or args.chunk_index != "off":
+        _, passages = normalize(cross_domain_dataset)
+    if args.bm25_index:
+        index = metrics.run("bm25", write_index, passages, args.output, args.jobs)
+        metrics.stages["bm25"]["rows_in"] = len(passages)
+        metrics.stages["bm25"]["bytes"] = sum(path.stat().st_size for path in index)
+        outputs += index
+    if args.chunk_index != "off":
+        path = metrics.run(
+            "chunks",
+            write_chunk_index,
+            passages,
+            args.output,
+            args.chunk_index,
+            args.chunk_size,
+        )
+        metrics.stages["chunks"]["rows_in"] = len(passages)
+        metrics.stages["chunks"]["bytes"] = path.stat().st_size
+        outputs.append(path)
+    return outputs
+
+
+# The shared source pool of a --seeds batch, set once in every worker.
+BATCH_POOL: Final[dict[str, pd.DataFrame]] = {}
+
+
+def set_batch_pool(pool: dict[str, pd.DataFrame]) -> None:
+    BATCH_POOL.clear()
+    BATCH_POOL.update(pool)
 
-    legal_tasks = legal["task_id"].unique()
-    samples_per_task = target_size // len(legal_tasks)
-    remainder = target_size % len(legal)
 
-    legal_samples = []
-    for i, task in enumerate(legal_tasks):
-        task_df = legal[legal["task_id"] == task]
-        n_samples = samples_per_task + (1 if i < remainder else 0)
-        n_samples = min(n_samples, len(task_df))
-        task_sample = task_df.sample(
-            n=n_samples, replace=False, random_state=random_seed
+def build_variant(
+    args: Namespace, seed: int, size: int
+) -> tuple[list[Path], RunMetrics]:
+    variant = Namespace(**vars(args))
+    variant.random_seed = seed
+    variant.target_size = size
+    variant.target_sizes = target_sizes(variant)
+    variant.output = str(variant_path(args.output, seed, size))
+
+    sources = {}
+    for name, df in BATCH_POOL.items():
+        reseed = SOURCES[name].reseed
+        sources[name] = df if reseed is None else compact(reseed(df, seed))
+
+    metrics = RunMetrics(profile_dir=args.profile)
+    cross_domain_dataset = assemble(variant, sources, metrics)
+    return write_outputs(variant, cross_domain_dataset, metrics), metrics
+
+
+def target_sizes(args: Namespace) -> dict[str, int]:
+    overrides = dict(args.domain_target_size)
+    sizes = {}
+    for name in args.domains:
+        size = overrides.get(name, SOURCES[name].target_size)
+        sizes[name] = args.target_size if size is None else size
+    return sizes
+
+
+def write_metrics(path: Path, metrics: RunMetrics) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(metrics.report(), f, indent=2)
+        f.write("\n")
+
+
+def main():
+    args = parse_args()
+    metrics = RunMetrics(profile_dir=args.profile)
+    try:
+        if args.seeds or args.batch_target_sizes:
+            run_batch(args, metrics)
+        else:
+            run(args, metrics)
+    finally:
+        if args.metrics is not None:
+            write_metrics(args.metrics, metrics)
+
+
+def configure(args: Namespace) -> LoadConfig:
+    config = LoadConfig(
+        random_seed=args.random_seed,
+        table_style=args.table_style,
+        finqa_splits=tuple(dict.fromkeys(args.finqa_splits)),
+        mctest_sets=tuple(dict.fromkeys(args.mctest_sets)),
+        mctest_splits=tuple(dict.fromkeys(args.mctest_splits)),
+    )
+    args.finqa_splits = list(config.finqa_splits)
+    args.mctest_sets = list(config.mctest_sets)
+    args.mctest_splits = list(config.mctest_splits)
+    args.domains = [name for name in SOURCES if name in args.domains]
+    args.target_sizes = target_sizes(args)
+    return config
+
+
+def run(args: Namespace, metrics: RunMetrics) -> None:
+    config = configure(args)
+    options = {
+        option: getattr(args, option)
+        for option in (
+            "domains",
+            "target_sizes",
+            "random_seed",
+            "table_style",
+            "finqa_splits",
+            "mctest_sets",
+            "mctest_splits",
+            "strata",
+            "shortfall",
+            "streaming",
+            "dedup",
+            "dedup_text_threshold",
+            "dedup_question_threshold",
+            "permutations",
+            "order",
+            "bucket_size",
+            "format",
+            "layout",
+            "shards",
+            "bm25_index",
+            "chunk_index",
+            "chunk_size",
         )
-        legal_samples.append(task_sample)
+    }
 
-    legal_balanced = pd.concat(legal_samples, ignore_index=True)
-    balanced_dfs.append(legal_balanced)
+    build = metrics.run("fingerprint", describe_build, config, options, args.domains)
+    previous = read_build_manifest(args.output)
+    if previous is not None:
+        outputs = previous.pop("outputs", [])
+        if previous != build:
+            report_changes(previous, build)
+        elif not outputs_intact(args.output, outputs):
+            print(f"{args.output} is missing or was modified, rewriting it")
+        elif not args.verify_incremental:
+            print(f"{args.output} is up to date")
+            return
+
+    cache = None
+    if not args.no_cache:
+        cache = FrameCache(path=args.cache_dir, max_bytes=args.cache_max_size << 20)
+
+    cross_domain_dataset, clusters = build_dataset(
+        args, config, cache, metrics, build["domains"]
+    )
 
-    cross_domain_dataset = pd.concat(balanced_dfs, ignore_index=True)
-    cross_domain_dataset = cross_domain_dataset.sample(
-        frac=1, random_state=random_seed
-    ).reset_index(drop=True)
+    if args.verify_incremental:
+        full, _ = build_dataset(args, config, None, RunMetrics(), build["domains"])
+        if not cross_domain_dataset.equals(full):
+            raise SystemExit("incremental build differs from a full rebuild")
+        print("incremental build matches a full rebuild")
+
+    outputs = write_outputs(args, cross_domain_dataset, metrics)
+    if clusters is not None:
+        outputs.append(write_dedup_report(args, clusters))
+
+    with open(build_manifest_path(args.output), "w", encoding="utf-8") as f:
+        json.dump({**build, "outputs": [file_entry(p) for p in outputs]}, f, indent=2)
+        f.write("\n")
+
+
+def run_batch(args: Namespace, metrics: RunMetrics) -> None:
+    # Sources are loaded, compacted and deduplicated once; every variant is
+    # then sampled from that pool, so a batch costs one load plus a
+    # sampling pass per variant.
+    config = configure(args)
+    cache = None
+    if not args.no_cache:
+        cache = FrameCache(path=args.cache_dir, max_bytes=args.cache_max_size << 20)
+    pool, clusters = load_sources(args, config, cache, metrics, run_base_loader)
+
+    seeds = args.seeds or [args.random_seed]
+    sizes = args.batch_target_sizes or [args.target_size]
+    variants = [(seed, size) for seed in seeds for size in sizes]
+    if args.jobs <= 1:
+        set_batch_pool(pool)
+        results = [build_variant(args, seed, size) for seed, size in variants]
+    else:
+        with ProcessPoolExecutor(
+            max_workers=min(args.jobs, len(variants)),
+            initializer=set_batch_pool,
+            initargs=(pool,),
+        ) as executor:
+            futures = [
+                executor.submit(build_variant, args, seed, size)
+                for seed, size in variants
+            ]
+            results = [future.result() for future in futures]
+
+    entries = []
+    for (seed, size), (outputs, variant_metrics) in zip(variants, results):
+        for stage, record in variant_metrics.stages.items():
+            metrics.stages[f"{stage}:{seed}:{size}"] = record
+        metrics.events.update(variant_metrics.events)
+        entries.append(
+            {
+                "random_seed": seed,
+                "target_size": size,
+                "files": [file_entry(path) for path in outputs],
+            }
+        )
 
-    cross_domain_dataset.to_csv(args.output, index=False)
+    manifest = {"seeds": seeds, "target_sizes": sizes, "variants": entries}
+    if clusters is not None:
+        manifest["dedup"] = file_entry(write_dedup_report(args, clusters))
+    with open(batch_manifest_path(args.output), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+        f.write("\n")
+    print(f"wrote {len(variants)} variants of {args.output}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,182 @@
+import json
+from bisect import bisect_right
+from collections.abc import Iterator
+from pathlib import Path
+from typing import Any, Final
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv
+import pyarrow.json
+import pyarrow.parquet as pq
+
+ANSWERS_TYPE: Final[pa.DataType] = pa.list_(
+    pa.struct([("label", pa.string()), ("text", pa.string())])
+)
+
+INDEXED_COLUMNS: Final[tuple[str, ...]] = ("domain", "task_id")
+
+
+def normalized_paths(path: str | Path) -> tuple[Path, Path]:
+    path = Path(path)
+    return (
+        path.with_name(f"{path.stem}.questions{path.suffix}"),
+        path.with_name(f"{path.stem}.passages{path.suffix}"),
+    )
+
+
+def shard_path(path: str | Path, index: int, shards: int) -> Path:
+    path = Path(path)
+    return path.with_name(f"{path.stem}-{index:05d}-of-{shards:05d}{path.suffix}")
+
+
+def variant_path(path: str | Path, random_seed: int, target_size: int) -> Path:
+    path = Path(path)
+    return path.with_name(
+        f"{path.stem}-seed{random_seed}-size{target_size}{path.suffix}"
+    )
+
+
+def manifest_path(path: str | Path) -> Path:
+    path = Path(path)
+    return path.with_name(f"{path.name}.manifest.json")
+
+
+def open_table(path: str | Path, fmt: str | None = None) -> pa.Table:
+    path = Path(path)
+    match fmt or path.suffix.removeprefix("."):
+        case "csv":
+            return pa.csv.read_csv(
+                path, parse_options=pa.csv.ParseOptions(newlines_in_values=True)
+            )
+        case "parquet":
+            return pq.read_table(path, memory_map=True)
+        case "arrow":
+            return pa.ipc.open_file(pa.memory_map(str(path))).read_all()
+        case "jsonl":
+            return pa.json.read_json(path)
+        case other:
+            raise ValueError(f"Unknown dataset format: {other}")
+
+
+def iter_normalized(
+    path: str | Path, fmt: str | None = None
+) -> Iterator[dict[str, Any]]:
+    questions_path, passages_path = normalized_paths(path)
+    questions = open_table(questions_path, fmt)
+    passages = open_table(passages_path, fmt)
+
+    rows = {pid: i for i, pid in enumerate(passages["passage_id"].to_pylist())}
+    texts = passages["text"]
+
+    for batch in questions.to_batches():
+        for row in batch.to_pylist():
+            row["text"] = texts[rows[row["passage_id"]]].as_py()
+            yield row
+
+
+def decode_answers_column(column: pa.ChunkedArray) -> pa.ChunkedArray:
+    # CSV stores answers as JSON strings and JSONL as [label, text] pairs;
+    # both are brought to the list<struct> type Parquet and Arrow files use.
+    if column.type == ANSWERS_TYPE:
+        return column
+    if pa.types.is_string(column.type) or pa.types.is_large_string(column.type):
+        encoded = column.dictionary_encode().combine_chunks()
+        choices = [json.loads(a) for a in encoded.dictionary.to_pylist()]
+        answers = pa.array(
+            [[{"label": label, "text": text} for label, text in c] for c in choices],
+            type=ANSWERS_TYPE,
+        )
+        return pa.chunked_array([answers.take(encoded.indices)])
+
+    chunks = []
+    for chunk in column.chunks:
+        pairs = chunk.flatten()
+        choices = pa.StructArray.from_arrays(
+            [pc.list_element(pairs, 0), pc.list_element(pairs, 1)],
+            fields=list(ANSWERS_TYPE.value_type),
+        )
+        offsets = pc.subtract(chunk.offsets, chunk.offsets[0])
+        chunks.append(pa.ListArray.from_arrays(offsets, choices, ANSWERS_TYPE))
+    return pa.chunked_array(chunks, ANSWERS_TYPE)
+
+
+def group_rows(column: pa.ChunkedArray) -> dict[str, np.ndarray]:
+    if not pa.types.is_dictionary(column.type):
+        column = column.dictionary_encode()
+    encoded = column.combine_chunks()
+    codes = encoded.indices.to_numpy(zero_copy_only=False)
+    order = np.argsort(codes, kind="stable")
+    bounds = np.searchsorted(codes[order], np.arange(len(encoded.dictionary) + 1))
+    return {
+        value: order[start:end]
+        for value, start, end in zip(
+            encoded.dictionary.to_pylist(), bounds[:-1], bounds[1:]
+        )
+        if start < end
+    }
+
+
+class CrossDomainDataset:
+    def __init__(self, path: str | Path, fmt: str | None = None):
+        # Arrow files are memory-mapped without copying; use --format arrow
+        # for datasets that are opened often.
+        table = open_table(path, fmt).unify_dictionaries()
+        if "answers" in table.column_names:
+            table = table.set_column(
+                table.schema.get_field_index("answers"),
+                "answers",
+                decode_answers_column(table["answers"]),
+            )
+        self.table = table
+        self.batches = table.to_batches()
+        self.offsets = np.cumsum([0] + [len(batch) for batch in self.batches])
+        # Row ids per value, ascending, so filters intersect cheaply.
+        self.index = {
+            name: group_rows(table[name])
+            for name in INDEXED_COLUMNS
+            if name in table.column_names
+        }
+
+    def __len__(self) -> int:
+        return self.table.num_rows
+
+    def __getitem__(self, row: int) -> dict[str, Any]:
+        if row < 0:
+            row += len(self)
+        if not 0 <= row < len(self):
+            raise IndexError(f"row {row} out of range for {len(self)} rows")
+        chunk = bisect_right(self.offsets, row) - 1
+        batch = self.batches[chunk]
+        row -= self.offsets[chunk]
+        return {
+            name: column[row].as_py()
+            for name, column in zip(batch.schema.names, batch.columns)
+        }
+
+    def rows(self, domain: str | None = None, task_id: str | None = None) -> np.ndarray:
+        rows = None
+        for name, value in (("domain", domain), ("task_id", task_id)):
+            if value is None:
+                continue
+            matches = self.index[name].get(value, np.empty(0, dtype=np.int64))
+            if rows is None:
+                rows = matches
+            else:
+                rows = np.intersect1d(rows, matches, assume_unique=True)
+        return np.arange(len(self)) if rows is None else rows
+
+    def iter_batches(
+        self,
+        batch_size: int = 1024,
+        domain: str | None = None,
+        task_id: str | None = None,
+    ) -> Iterator[pa.RecordBatch]:
+        if domain is None and task_id is None:
+            yield from self.table.to_batches(max_chunksize=batch_size)
+            return
+        rows = self.rows(domain, task_id)
+        for start in range(0, len(rows), batch_size):
+            taken = self.table.take(rows[start : start + batch_size])
+            yield taken.combine_chunks().to_batches()[0]
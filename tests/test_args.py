@@ -0,0 +1,30 @@
+import sys
+import unittest
+from unittest import mock
+
+import main
+
+
+class ParseArgsTest(unittest.TestCase):
+    def parse(self, *argv: str):
+        with mock.patch.object(sys, "argv", ["main.py", "--output", "o.csv", *argv]):
+            return main.parse_args()
+
+    def assert_rejected(self, *argv: str) -> None:
+        with mock.patch("sys.stderr"), self.assertRaises(SystemExit):
+            self.parse(*argv)
+
+    def test_bucket_size_must_be_positive(self):
+        self.assertEqual(self.parse("--bucket-size", "1").bucket_size, 1)
+        for value in ("0", "-3"):
+            self.assert_rejected("--bucket-size", value)
+
+    def test_shards_must_be_positive(self):
+        self.assertIsNone(self.parse().shards)
+        self.assertEqual(self.parse("--shards", "1").shards, 1)
+        for value in ("0", "-2"):
+            self.assert_rejected("--shards", value)
+
+
+if __name__ == "__main__":
+    unittest.main()
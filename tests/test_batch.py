@@ -0,0 +1,94 @@
+import json
+import os
+import random
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from typing import Any
+from unittest import mock
+
+import pandas as pd
+
+import main
+
+
+def finqa_record(rnd: random.Random, record_id: str) -> dict[str, Any]:
+    def words(n: int) -> str:
+        return " ".join(f"w{rnd.randrange(5000)}" for _ in range(n))
+
+    return {
+        "id": record_id,
+        "pre_text": [words(30) for _ in range(3)],
+        "post_text": [words(30)],
+        "table": [["", "2019"], ["revenue", f"${rnd.randint(1, 999)}"]],
+        "qa": {"question": f"{words(10)}?", "answer": "", "exe_ans": rnd.random()},
+    }
+
+
+class BatchTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(directory.name)
+
+        # 40 distinct records, the first 20 repeated under new ids.
+        rnd = random.Random(0)
+        records = [finqa_record(rnd, f"record-{i}") for i in range(40)]
+        records += [{**r, "id": f"copy-{i}"} for i, r in enumerate(records[:20])]
+        main.FINQA_DIR.mkdir(parents=True)
+        main.finqa_path("test").write_text(json.dumps(records), encoding="utf-8")
+
+    def run_main(self, *argv: str) -> None:
+        with mock.patch.object(sys, "argv", ["main.py", *argv]):
+            main.main()
+
+    def test_dedup_clusters_finqa_rows(self):
+        options = ["--domains", "financial", "--target-size", "15", "--no-cache"]
+        self.run_main(
+            "--output", "batch.csv", "--seeds", "1-2", "--dedup", "keep-one", *options
+        )
+
+        report = json.loads(Path("batch.csv.dedup.json").read_text())
+        self.assertEqual(len(report["clusters"]), 20)
+        self.assertEqual(report["dropped"], 20)
+        for cluster in report["clusters"]:
+            self.assertEqual(cluster["domains"], {"financial": 2})
+            self.assertEqual({row["task_id"] for row in cluster["rows"]}, {"finqa"})
+
+        # Each variant matches a single run with the same seed.
+        for seed in ("1", "2"):
+            self.run_main(
+                "--output",
+                f"single{seed}.csv",
+                "--random-seed",
+                seed,
+                "--dedup",
+                "keep-one",
+                *options,
+            )
+            self.assertEqual(
+                Path(f"batch-seed{seed}-size15.csv").read_bytes(),
+                Path(f"single{seed}.csv").read_bytes(),
+            )
+
+    def test_base_frame_is_cached(self):
+        config = main.LoadConfig(random_seed=1)
+        cache = main.FrameCache(path=Path(".cache"), max_bytes=1 << 30)
+        with mock.patch.object(
+            main, "iter_finqa_batches", wraps=main.iter_finqa_batches
+        ) as reader:
+            loaded = main.run_base_loader("financial", config, cache)
+            cached = main.run_base_loader("financial", config, cache)
+        self.assertEqual(reader.call_count, 1)
+        pd.testing.assert_frame_equal(loaded, cached)
+
+        # The base frame doesn't depend on the seed.
+        with mock.patch.object(main, "iter_finqa_batches") as reader:
+            main.run_base_loader("financial", main.LoadConfig(random_seed=2), cache)
+        reader.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
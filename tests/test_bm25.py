@@ -0,0 +1,73 @@
+import math
+import random
+import re
+import tempfile
+import unittest
+from collections import Counter
+from pathlib import Path
+
+import pandas as pd
+
+from bm25 import BM25Index, write_index
+
+WORDS = (
+    "merger agreement material adverse effect rich zürich café naïve µg kg "
+    "tnf-α patients étude résultats κείμενο revenue percent"
+).split()
+
+
+def brute_force(texts: list[str], query: str, k: int) -> list[tuple[int, float]]:
+    # Python's \w is Unicode-aware, unlike RE2's.
+    docs = [Counter(re.findall(r"\w+", text.lower())) for text in texts]
+    lengths = [sum(doc.values()) for doc in docs]
+    average = sum(lengths) / len(lengths)
+    scores = []
+    for i, doc in enumerate(docs):
+        score = 0.0
+        for term in set(re.findall(r"\w+", query.lower())):
+            if term in doc:
+                df = sum(term in other for other in docs)
+                idf = math.log(1 + (len(docs) - df + 0.5) / (df + 0.5))
+                tf = doc[term]
+                norm = 1.2 * (1 - 0.75 + 0.75 * lengths[i] / average)
+                score += idf * tf * 2.2 / (tf + norm)
+        if score:
+            scores.append((i, score))
+    return sorted(scores, key=lambda hit: (-hit[1], hit[0]))[:k]
+
+
+class BM25Test(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = Path(directory.name) / "dataset.csv"
+
+    def test_matches_brute_force(self):
+        rnd = random.Random(0)
+        texts = [" ".join(rnd.choices(WORDS, k=rnd.randint(5, 40))) for _ in range(200)]
+        texts.append("")
+        passages = pd.DataFrame(
+            {"passage_id": [f"p{i}" for i in range(len(texts))], "text": texts}
+        )
+        write_index(passages, self.path)
+        index = BM25Index(self.path)
+
+        for query in ("Zürich café", "TNF-α µg", "κείμενο résultats", "rich merger"):
+            expected = brute_force(texts, query, 10)
+            hits = index.search(query, k=10)
+            self.assertEqual([pid for pid, _ in hits], [f"p{i}" for i, _ in expected])
+            for (_, score), (_, reference) in zip(hits, expected):
+                self.assertAlmostEqual(score, reference)
+
+    def test_non_ascii_words_are_not_fragments(self):
+        passages = pd.DataFrame(
+            {"passage_id": ["rich", "zürich"], "text": ["rich text", "Zürich text"]}
+        )
+        write_index(passages, self.path)
+        self.assertEqual(
+            [pid for pid, _ in BM25Index(self.path).search("Zürich")], ["zürich"]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from pathlib import Path
+from unittest import mock
+
+import pandas as pd
+import pyarrow as pa
+
+import main
+from tests.test_batch import finqa_record
+
+
+class BuildManifestTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(directory.name)
+
+        rnd = random.Random(0)
+        records = [finqa_record(rnd, f"record-{i}") for i in range(20)]
+        main.FINQA_DIR.mkdir(parents=True)
+        main.finqa_path("test").write_text(json.dumps(records), encoding="utf-8")
+
+    def run_main(self, *argv: str, domain: str = "financial") -> str:
+        options = ["--domains", domain, "--target-size", "10"]
+        with mock.patch.object(sys, "argv", ["main.py", *argv, *options]):
+            with redirect_stdout(io.StringIO()) as out:
+                main.main()
+        return out.getvalue()
+
+    def test_formats_keep_separate_manifests(self):
+        self.run_main("--output", "o.parquet", "--format", "parquet")
+        self.run_main("--output", "o.arrow", "--format", "arrow")
+        self.assertTrue(Path("o.parquet.build.json").exists())
+        self.assertTrue(Path("o.arrow.build.json").exists())
+
+        for name, format in (("o.parquet", "parquet"), ("o.arrow", "arrow")):
+            out = self.run_main("--output", name, "--format", format)
+            self.assertIn(f"{name} is up to date", out)
+
+    def test_formats_keep_separate_sidecars(self):
+        sidecars = ("manifest.json", "dedup.json", "bm25.terms.arrow")
+        for format in ("csv", "parquet"):
+            self.run_main(
+                *("--output", f"o.{format}", "--format", format, "--shards", "2"),
+                *("--dedup", "report", "--bm25-index"),
+            )
+        for format in ("csv", "parquet"):
+            for sidecar in sidecars:
+                self.assertTrue(Path(f"o.{format}.{sidecar}").exists())
+            manifest = json.loads(Path(f"o.{format}.manifest.json").read_text())
+            for shard in manifest["shards"]:
+                for entry in shard["files"]:
+                    self.assertTrue(entry["path"].endswith(f".{format}"))
+
+    def test_pubmedqa_snapshot_is_fingerprinted(self):
+        def write_snapshot(question: str) -> None:
+            table = pa.table(
+                {
+                    "pubid": pa.array(range(20), pa.int32()),
+                    "contexts": [[f"context {i}"] for i in range(20)],
+                    "question": [f"{question} {i}?" for i in range(20)],
+                    "final_decision": ["yes", "no", "maybe", "yes"] * 5,
+                }
+            )
+            main.PUBMEDQA_SNAPSHOT.parent.mkdir(parents=True, exist_ok=True)
+            with pa.ipc.new_file(main.PUBMEDQA_SNAPSHOT, table.schema) as writer:
+                writer.write_table(table)
+
+        write_snapshot("old")
+        self.run_main("--output", "o.csv", domain="medical")
+        write_snapshot("new")
+        out = self.run_main("--output", "o.csv", domain="medical")
+        self.assertNotIn("up to date", out)
+        questions = pd.read_csv("o.csv")["question"]
+        self.assertTrue(questions.str.startswith("new").all())
+
+    def test_missing_input_fails_as_loader_error(self):
+        main.finqa_path("test").unlink()
+        for jobs in ("1", "4"):
+            with self.assertRaises(main.LoaderError) as raised:
+                self.run_main("--output", "o.csv", "--jobs", jobs)
+            self.assertIn("financial loader failed", str(raised.exception))
+
+    def test_inputs_are_hashed_once(self):
+        with mock.patch.object(main, "digest", wraps=main.digest) as digest:
+            self.run_main("--output", "o.csv")
+        hashed = [
+            part
+            for call in digest.call_args_list
+            for part in call.args
+            if isinstance(part, Path)
+        ]
+        self.assertEqual(hashed, [main.finqa_path("test")])
+
+
+if __name__ == "__main__":
+    unittest.main()
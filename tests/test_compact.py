@@ -0,0 +1,28 @@
+import unittest
+
+import pandas as pd
+
+import main
+
+
+class CompactTest(unittest.TestCase):
+    def test_only_repeated_columns_become_categoricals(self):
+        df = pd.DataFrame(
+            {
+                "domain": "medical",
+                "task_id": "pubmedqa",
+                "text": [f"context {i}" for i in range(10)],
+                "question": [f"question {i}?" for i in range(10)],
+                "answers": '[["A", "yes"], ["B", "no"]]',
+                "answer": ["A", "B"] * 5,
+            }
+        )
+        dtypes = main.compact(df).dtypes
+        for name in ("domain", "task_id", "answers", "answer"):
+            self.assertIsInstance(dtypes[name], pd.CategoricalDtype)
+        for name in ("text", "question"):
+            self.assertEqual(dtypes[name], main.TEXT_DTYPE)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+import random
+import unittest
+
+import pandas as pd
+import pyarrow as pa
+
+from dedup import DedupConfig, deduplicate, tokenize
+
+
+def greek(rnd: random.Random, n: int) -> str:
+    return " ".join(
+        "".join(rnd.choices("αβγδεζηθικλμνξοπρστυφχψω", k=6)) for _ in range(n)
+    )
+
+
+class TokenizeTest(unittest.TestCase):
+    def test_non_ascii_words_stay_whole(self):
+        tokens, rows = tokenize(
+            pa.array(["café naïve µg/kg TNF-α Zürich", "", "中文 x_2"])
+        )
+        self.assertEqual(
+            tokens.to_pylist(),
+            ["café", "naïve", "µg", "kg", "tnf", "α", "zürich", "中文", "x_2"],
+        )
+        self.assertEqual(rows.tolist(), [0] * 7 + [2] * 2)
+
+
+class DeduplicateTest(unittest.TestCase):
+    def test_non_ascii_duplicates_are_clustered(self):
+        rnd = random.Random(0)
+        texts = [greek(rnd, 60) for _ in range(10)]
+        questions = [greek(rnd, 8) for _ in range(10)]
+        df = pd.DataFrame(
+            {
+                "task_id": "pubmedqa",
+                "text": [*texts, texts[3]],
+                "question": [*questions, questions[3]],
+            }
+        )
+
+        kept, clusters = deduplicate({"medical": df}, DedupConfig(), "keep-one")
+        self.assertEqual(len(kept["medical"]), 10)
+        self.assertEqual(len(clusters), 1)
+        self.assertEqual([row["row"] for row in clusters[0]["rows"]], [3, 10])
+
+    def test_duplicates_behind_another_question_are_clustered(self):
+        # One passage asked two ways; the second question is repeated.
+        rnd = random.Random(0)
+        text = greek(rnd, 60)
+        first, second = greek(rnd, 8), greek(rnd, 8)
+        for questions in ([first, second, second], [second, first, second]):
+            df = pd.DataFrame(
+                {"task_id": "finqa", "text": [text] * 3, "question": questions}
+            )
+            kept, clusters = deduplicate({"financial": df}, DedupConfig(), "keep-one")
+            self.assertEqual(len(clusters), 1)
+            self.assertEqual(
+                [row["question"] for row in clusters[0]["rows"]], [second, second]
+            )
+            self.assertEqual(kept["financial"]["question"].tolist(), questions[:2])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,27 @@
+import unittest
+
+import main
+
+
+class MeasureTest(unittest.TestCase):
+    def test_peak_rss_is_per_stage(self):
+        if not main.reset_peak_rss():
+            self.skipTest("the RSS high-water mark can't be reset here")
+
+        def allocate(mib: int) -> int:
+            return len(b"x" * (mib << 20))
+
+        metrics = main.RunMetrics()
+        metrics.run("large", allocate, 256)
+        metrics.run("small", allocate, 1)
+        large, small = metrics.stages["large"], metrics.stages["small"]
+        self.assertGreater(large["peak_rss_mib"], 256)
+        self.assertLess(small["peak_rss_mib"], large["peak_rss_mib"] - 200)
+        self.assertNotIn("process_peak_rss_mib", small)
+        # Resetting between stages must not hide the run's peak.
+        total = metrics.report()["total"]
+        self.assertGreaterEqual(total["peak_rss_mib"], large["peak_rss_mib"])
+
+
+if __name__ == "__main__":
+    unittest.main()
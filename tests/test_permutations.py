@@ -0,0 +1,64 @@
+import json
+import math
+import sys
+import unittest
+from itertools import permutations
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+import main
+
+
+def row(size: int, answer: int) -> dict[str, str]:
+    letters = [chr(ord("A") + i) for i in range(size)]
+    return {
+        "text": f"passage {size}",
+        "question": "question?",
+        "answers": json.dumps([(label, f"choice {label}") for label in letters]),
+        "answer": letters[answer],
+    }
+
+
+class PermuteAnswersTest(unittest.TestCase):
+    def test_unrank_covers_every_order(self):
+        orders = main.unrank_permutations(np.arange(24), 4)
+        self.assertEqual([tuple(o) for o in orders], list(permutations(range(4))))
+
+    def test_copies_get_distinct_orders(self):
+        df = pd.DataFrame(
+            [row(size, i % size) for i in range(50) for size in (2, 3, 4, 10)]
+        )
+        k = 5
+        permuted = main.permute_answers(df, k, 42)
+        self.assertEqual(len(permuted), len(df) * k)
+
+        for example, copies in permuted.groupby("example_id", observed=True):
+            original = df.iloc[example]
+            size = len(json.loads(original["answers"]))
+            orders = [
+                tuple(text for _, text in json.loads(answers))
+                for answers in copies["answers"]
+            ]
+            self.assertEqual(
+                orders[0], tuple(t for _, t in json.loads(original["answers"]))
+            )
+            # Distinct while there are orders left, then the others repeat.
+            self.assertEqual(len(set(orders)), min(k, math.factorial(size)))
+            if math.factorial(size) > k:
+                self.assertNotIn(orders[0], orders[1:])
+
+            correct = dict(json.loads(original["answers"]))[original["answer"]]
+            for answers, answer in zip(copies["answers"], copies["answer"]):
+                self.assertEqual(dict(json.loads(answers))[answer], correct)
+
+    def test_rejects_fewer_than_one_copy(self):
+        argv = ["main.py", "--output", "out.csv", "--permutations", "0"]
+        with mock.patch.object(sys, "argv", argv), mock.patch("sys.stderr"):
+            with self.assertRaises(SystemExit):
+                main.parse_args()
+
+
+if __name__ == "__main__":
+    unittest.main()
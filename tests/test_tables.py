@@ -0,0 +1,54 @@
+import unittest
+
+import main
+
+
+class PipeTableTest(unittest.TestCase):
+    def test_pads_every_column(self):
+        table = [["", " 2019 ", "2018"], ["revenue", "$ 5%", 12.5]]
+        self.assertEqual(
+            main.format_table_as_text(table),
+            "        | 2019 | 2018\n------- | ---- | ----\nrevenue | $ 5% | 12.5",
+        )
+
+    def test_ragged_rows_pad_only_first_row_columns(self):
+        table = [["a", "b"], ["long", "c", "extra"], ["x"]]
+        self.assertEqual(
+            main.format_table_as_text(table),
+            "a    | b\n---- | -\nlong | c | extra\nx   ",
+        )
+
+    def test_single_row_has_no_separator(self):
+        self.assertEqual(main.format_table_as_text([[" a ", "%s"]]), "a | %s")
+        self.assertEqual(main.format_table_as_text([]), "")
+
+
+class RenderedMemoTest(unittest.TestCase):
+    def test_reuses_tables_with_equal_content(self):
+        rendered = {}
+        tables = [
+            [["a", "b"], ["1", "2"]],
+            [["a", "b"], ["1", "2"]],
+            [["a", "b"], ["3", "4"]],
+            [["a\x1fb"], ["1\x1f2"]],
+        ]
+        for table in tables:
+            self.assertEqual(
+                main.format_table_as_text(table, "pipe", rendered),
+                main.format_table_as_text(table),
+            )
+        self.assertEqual(len(rendered), 2)
+        self.assertIs(rendered["pipe\x1ea\x1fb\x1e1\x1f2"][0], tables[3])
+
+    def test_non_string_cells_are_rendered_uncached(self):
+        rendered = {}
+        table = [["year", 2019], ["revenue", 12.5]]
+        self.assertEqual(
+            main.format_table_as_text(table, "pipe", rendered),
+            main.format_table_as_text(table),
+        )
+        self.assertEqual(rendered, {})
+
+
+if __name__ == "__main__":
+    unittest.main()